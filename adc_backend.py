@@ -0,0 +1,198 @@
+# adc_backend.py
+#
+# Pluggable analog input backends for the sensor modules. Nothing touches the
+# I2C bus until the first reading, so the sensor modules import instantly and
+# also work off-target with the simulated or replay backend.
+#
+# The backend is chosen with the ADC_BACKEND environment variable:
+#   ADC_BACKEND=ads1115 (default)   real ADS1115 on the Raspberry Pi I2C bus
+#   ADC_BACKEND=simulated           constant voltages plus optional noise
+#   ADC_BACKEND=replay:<file.csv>   voltages recorded earlier, see ReplayBackend
+
+import csv
+import os
+import random
+import time
+from threading import Lock, RLock
+
+_i2c = None
+_i2c_lock = Lock()
+
+
+def get_i2c():
+    """Return the shared I2C bus, opening it on first use."""
+    global _i2c
+    with _i2c_lock:
+        if _i2c is None:
+            import board
+            import busio
+            _i2c = busio.I2C(board.SCL, board.SDA)
+        return _i2c
+
+
+class AdcBackend:
+    """Interface of an analog input backend with numbered single-ended channels."""
+
+    name = "base"
+
+    def read_voltage(self, channel, gain=None, data_rate=None):
+        """Return the voltage of a channel in volts.
+
+        gain and data_rate override the backend defaults for this conversion.
+        """
+        raise NotImplementedError()
+
+    def start_continuous(self, channel, data_rate):
+        """Convert one channel continuously at data_rate samples per second."""
+
+    def stop_continuous(self):
+        """Return to single-shot conversions."""
+
+
+class Ads1115Backend(AdcBackend):
+    """ADS1115 on the shared I2C bus, created on the first reading."""
+
+    name = "ads1115"
+
+    def __init__(self, gain=2/3):
+        self.gain = gain  # 2/3 measures up to 6.144 V
+        self._ads = None
+        self._channels = {}
+        self._lock = RLock()  # Conversions of different channels must not interleave
+
+    def _get_ads(self):
+        if self._ads is None:
+            import adafruit_ads1x15.ads1115 as ADS
+            self._ads = ADS.ADS1115(get_i2c())
+            self._ads.gain = self.gain
+        return self._ads
+
+    def _get_channel(self, channel):
+        if channel not in self._channels:
+            import adafruit_ads1x15.ads1115 as ADS
+            from adafruit_ads1x15.analog_in import AnalogIn
+            pins = [ADS.P0, ADS.P1, ADS.P2, ADS.P3]
+            self._channels[channel] = AnalogIn(self._get_ads(), pins[channel])
+        return self._channels[channel]
+
+    def read_voltage(self, channel, gain=None, data_rate=None):
+        with self._lock:
+            ads = self._get_ads()
+            ads.gain = self.gain if gain is None else gain
+            if data_rate is None:
+                return self._get_channel(channel).voltage
+            # The override applies to this read only; continuous mode and
+            # other readers keep the rate they set
+            previous_rate = ads.data_rate
+            ads.data_rate = data_rate
+            try:
+                return self._get_channel(channel).voltage
+            finally:
+                ads.data_rate = previous_rate
+
+    def start_continuous(self, channel, data_rate):
+        from adafruit_ads1x15.ads1x15 import Mode
+        with self._lock:
+            ads = self._get_ads()
+            ads.data_rate = data_rate
+            ads.mode = Mode.CONTINUOUS
+            self._get_channel(channel).voltage  # Select the channel; conversions start now
+
+    def stop_continuous(self):
+        from adafruit_ads1x15.ads1x15 import Mode
+        with self._lock:
+            self._get_ads().mode = Mode.SINGLE
+
+
+class SimulatedBackend(AdcBackend):
+    """Returns configured voltages per channel, optionally with Gaussian noise.
+
+    A channel value may be a number or a function of the elapsed time in
+    seconds returning the voltage.
+    """
+
+    name = "simulated"
+
+    def __init__(self, voltages=None, noise=0.0):
+        # Defaults: clean air on the hydrogen sensor, no reference flow
+        self.voltages = {0: 0.821, 1: 0.0} if voltages is None else dict(voltages)
+        self.noise = noise
+        self._start = time.monotonic()
+
+    def read_voltage(self, channel, gain=None, data_rate=None):
+        value = self.voltages.get(channel, 0.0)
+        if callable(value):
+            value = value(time.monotonic() - self._start)
+        if self.noise:
+            value += random.gauss(0, self.noise)
+        return value
+
+
+class ReplayBackend(AdcBackend):
+    """Plays back voltages recorded to a CSV file in real time.
+
+    The first column is the time in seconds, every further column the
+    voltage of channel 0, 1, ... A header row is skipped. Readings return the
+    recorded value at the current replay time; playback loops at the end.
+    """
+
+    name = "replay"
+
+    def __init__(self, path, loop=True):
+        self.path = path
+        self.loop = loop
+        self.times = []
+        self.rows = []
+        with open(path, newline="") as file:
+            for row in csv.reader(file):
+                try:
+                    values = [float(value) for value in row]
+                except ValueError:
+                    continue  # Header or comment
+                if values:
+                    self.times.append(values[0])
+                    self.rows.append(values[1:])
+        if not self.rows:
+            raise ValueError(f"No samples found in {path}.")
+        self._start = time.monotonic()
+
+    def read_voltage(self, channel, gain=None, data_rate=None):
+        import bisect
+        elapsed = time.monotonic() - self._start + self.times[0]
+        duration = self.times[-1] - self.times[0]
+        if self.loop and duration > 0:
+            elapsed = self.times[0] + (elapsed - self.times[0]) % duration
+        index = max(0, bisect.bisect_right(self.times, elapsed) - 1)
+        row = self.rows[index]
+        return row[channel] if channel < len(row) else 0.0
+
+
+_backend = None
+_backend_lock = Lock()
+
+
+def create_backend(spec):
+    """Create a backend from an ADC_BACKEND style specification."""
+    if spec.startswith("replay:"):
+        return ReplayBackend(spec[len("replay:"):])
+    if spec == "simulated":
+        return SimulatedBackend()
+    if spec == "ads1115":
+        return Ads1115Backend()
+    raise ValueError(f"Unknown ADC backend '{spec}'.")
+
+
+def get_backend():
+    """Return the active backend, creating it from ADC_BACKEND on first use."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_backend(os.environ.get("ADC_BACKEND", "ads1115"))
+        return _backend
+
+
+def set_backend(backend):
+    """Replace the active backend, e.g. with a SimulatedBackend in tools."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
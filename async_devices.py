@@ -0,0 +1,88 @@
+# async_devices.py
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from sensirion_shdlc_sfc5xxx import Sfc5xxxScaling
+import hydrogensensor
+
+# All ADC reads share one thread so I2C conversions never interleave
+_adc_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="adc-io")
+
+
+class AsyncFlowController:
+    """asyncio front end for a connected FlowController.
+
+    Every call is executed by the controller's port worker, so it is ordered
+    with the synchronous API. Each call takes an optional deadline in seconds;
+    a call that times out or is cancelled before it was sent never reaches
+    the device.
+    """
+
+    def __init__(self, controller, timeout=None):
+        self.controller = controller
+        self.timeout = controller.timeout if timeout is None else timeout
+
+    async def _run(self, future, timeout):
+        timeout = self.timeout if timeout is None else timeout
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+
+    def _require_device(self):
+        if not self.controller.device:
+            raise ConnectionError(f"Device on port {self.controller.port} is not connected.")
+        return self.controller.device
+
+    async def read_flow(self, timeout=None):
+        """Return the measured flow in sccm."""
+        device = self._require_device()
+        future = self.controller.worker.submit(device.read_measured_value, Sfc5xxxScaling.USER_DEFINED)
+        return await self._run(future, timeout)
+
+    async def read_setpoint(self, timeout=None):
+        """Return the current setpoint in sccm."""
+        device = self._require_device()
+        future = self.controller.worker.submit(device.get_setpoint, Sfc5xxxScaling.USER_DEFINED)
+        return await self._run(future, timeout)
+
+    async def set_setpoint(self, flow_rate, timeout=None):
+        """Write a setpoint (coalesced and deadbanded like set_flow_rate) and wait for the ack."""
+        self._require_device()
+        future = self.controller.worker.submit_setpoint(self.controller._write_setpoint, flow_rate)
+        return await self._run(future, timeout)
+
+
+async def _run_on_adc(func, timeout):
+    loop = asyncio.get_running_loop()
+    return await asyncio.wait_for(loop.run_in_executor(_adc_executor, func), timeout)
+
+
+async def read_ppm(timeout=1.0, reader=hydrogensensor.hydrogen_sensor):
+    """Return the hydrogen concentration in ppm."""
+    return await _run_on_adc(reader, timeout)
+
+
+async def poll_all(controllers, timeout=0.5, ppm_reader=hydrogensensor.hydrogen_sensor):
+    """Read all MFCs (AsyncFlowControllers) and the hydrogen sensor concurrently.
+
+    Returns a list with one measured flow per controller followed by the ppm
+    value (left out if ppm_reader is None). A read that fails or misses the
+    deadline is returned as its exception, so a single slow device cannot
+    stall the others.
+    """
+    reads = [controller.read_flow(timeout) for controller in controllers]
+    if ppm_reader is not None:
+        reads.append(read_ppm(timeout, ppm_reader))
+    return await asyncio.gather(*reads, return_exceptions=True)
+
+
+async def zero_all(controllers, timeout=None):
+    """Set every MFC (FlowController) to zero flow and read the setpoints back.
+
+    Returns the setpoint each device reports after acknowledging the zero,
+    or the exception of the write or read that failed or missed the deadline.
+    """
+    async def zero(mfc):
+        await mfc.set_setpoint(0)
+        return await mfc.read_setpoint()
+
+    mfcs = [AsyncFlowController(controller, timeout) for controller in controllers]
+    return await asyncio.gather(*(zero(mfc) for mfc in mfcs), return_exceptions=True)
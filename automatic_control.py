@@ -0,0 +1,165 @@
+# automatic_control.py
+#
+# The automatic mode's closed loop without any GUI: runs a (minutes, ppm
+# setpoint) sequence with the PID, feedforward and Kalman stages against the
+# rig. Used by the automatic mode window, its control process and tools.
+
+from collections import namedtuple
+from rig_config import HYDROGEN_INDEX, AIR_INDEX
+from kamlan_filter import BatchKalmanFilter
+from control_loop import ControlLoop
+from pid_controller import from_legacy_gains
+from feedforward import MixingModel, ReferenceTrajectory, SteadyStateDetector
+
+# PID period in seconds
+CONTROL_PERIOD = 0.1
+
+# Low-pass time constant of the PID derivative term in seconds
+DERIVATIVE_FILTER_TIME = 0.5
+
+# Time constant in seconds of the reading's approach to a new setpoint; with
+# feedforward the PID tracks this expected response instead of the step
+REFERENCE_TIME_CONSTANT = 20.0
+
+# Kalman filter on the hydrogen reading ahead of the PID (variances in ppm^2)
+KALMAN_PROCESS_VARIANCE = 100.0
+KALMAN_MEASUREMENT_VARIANCE = 2500.0
+
+# Parameters of one run: PID gains in the automatic mode's units, total flow
+# in sccm and the optional stages
+ControlSettings = namedtuple("ControlSettings", ["kp", "ki", "kd", "flow_setpoint", "use_filter", "use_feedforward"])
+
+# Settings the automatic mode window and the headless runner start from
+DEFAULT_SETTINGS = ControlSettings(kp=0.395, ki=0.035, kd=0.1, flow_setpoint=100, use_filter=True, use_feedforward=True)
+
+# One executed control step: step number, sample timestamp (time.monotonic()),
+# ppm setpoint, ppm fed to the PID, commanded hydrogen flow (sccm), raw ppm
+# reading, measured total flow (sccm) and the index of the sequence row
+ControlStep = namedtuple("ControlStep", ["step", "timestamp", "setpoint", "measured", "hydrogen_flow",
+                                         "ppm", "total_flow", "sequence_index"])
+
+
+def make_ppm_filter():
+    """Kalman stage for a SamplingService feeding an AutomaticController."""
+    return BatchKalmanFilter(KALMAN_PROCESS_VARIANCE, KALMAN_MEASUREMENT_VARIANCE)
+
+
+class AutomaticController:
+    """Runs automatic mode sequences on the rig's controllers.
+
+    Reads come from a SamplingService (give it make_ppm_filter() to enable
+    the Kalman stage). run() blocks until the sequence ends or stop() is
+    called; every control step is passed to on_step(ControlStep) on the
+    calling thread.
+    """
+
+    def __init__(self, controllers, sampler, on_step=None):
+        self.controllers = controllers
+        self.hydrogen_controller = controllers[HYDROGEN_INDEX]
+        self.air_controller = controllers[AIR_INDEX]
+        self.sampler = sampler
+        self.on_step = on_step
+        self.running = False
+        self.control_loop = None
+        self.loop_stats = []
+
+        # Feedforward: the mixing model predicts the flow split for each
+        # setpoint so the PID only corrects the residual; it learns from the
+        # steady states reached during runs
+        self.mixing_model = MixingModel.load()
+        self.steady_state = SteadyStateDetector()
+        self.reference = ReferenceTrajectory(REFERENCE_TIME_CONSTANT)
+
+    def run(self, sequence, settings):
+        """Execute each (minutes, setpoint) pair with the control loop, then zero all flows.
+
+        Returns True if the sequence ran to the end, False if it was stopped.
+        """
+        self.settings = settings
+        self.pid = from_legacy_gains(settings.kp, settings.ki, settings.kd, output_limits=(0, 100),
+                                     derivative_time_constant=DERIVATIVE_FILTER_TIME)
+        self.reference.reset()
+        self.step_count = 0
+        self.loop_stats = []
+        self.running = True
+        try:
+            for index, (minutes, setpoint) in enumerate(sequence):
+                if not self.running:
+                    break
+                self.sequence_index = index
+                self.setpoint = setpoint
+                self.steady_state.reset()
+                self.run_for_duration(minutes)
+            return self.running
+        finally:
+            self.running = False
+            self.zero_all_flows()
+            try:
+                self.mixing_model.save()
+            except OSError as e:
+                print(f"Error saving mixing model: {e}")
+
+    def run_for_duration(self, minutes):
+        """Run the PID control loop for the specified duration in minutes."""
+        loop = ControlLoop(CONTROL_PERIOD, self.control_step, name="automatic-control")
+        self.control_loop = loop
+        stats = loop.run(duration=minutes * 60, should_continue=lambda: self.running)
+        self.loop_stats.append(stats)
+        print(f"[Control] {stats.iterations} steps, {stats.overruns} overruns ({stats.skipped} periods skipped), "
+              f"jitter mean {stats.mean_jitter * 1000:.2f} ms / max {stats.max_jitter * 1000:.2f} ms, "
+              f"step max {stats.max_duration * 1000:.2f} ms")
+
+    def stop(self):
+        self.running = False
+        if self.control_loop is not None:
+            self.control_loop.stop()
+
+    def zero_all_flows(self):
+        """Set every MFC of the rig to zero flow."""
+        for controller in self.controllers:
+            controller.set_flow_rate(0)
+
+    def control_step(self):
+        """One control period: newest sample in, PID, flow rates out."""
+        sample = self.sampler.latest()
+        if sample is None or sample.ppm is None:
+            return
+        settings = self.settings
+        measured_value = sample.filtered_ppm if settings.use_filter else sample.ppm
+
+        # Feedforward share of hydrogen for the setpoint; the PID corrects the
+        # residual within what is left of the 0-100 % range
+        if settings.use_feedforward:
+            feedforward = self.mixing_model.control_signal(self.setpoint)
+            if self.reference.value is None:
+                self.reference.reset(measured_value)  # Bumpless start from the current reading
+            pid_setpoint = self.reference.update(self.setpoint, CONTROL_PERIOD)
+        else:
+            feedforward = 0.0
+            pid_setpoint = self.setpoint
+        self.pid.output_limits = (-feedforward, 100 - feedforward)
+
+        # Calculate control signal using PID algorithm to match the current setpoint
+        control_signal = feedforward + self.pid.compute(pid_setpoint, measured_value)
+
+        # Calculate flow rates for both controllers based on control signal
+        hydrogen_flowrate = (settings.flow_setpoint / 100) * control_signal
+        air_flowrate = settings.flow_setpoint - hydrogen_flowrate
+
+        # Apply flow rates to the controllers
+        self.hydrogen_controller.set_flow_rate(hydrogen_flowrate)
+        self.air_controller.set_flow_rate(air_flowrate)
+
+        # Refine the mixing model with the measured flow split once the reading settled
+        total_flow = sample.flows[HYDROGEN_INDEX] + sample.flows[AIR_INDEX]
+        if total_flow > 0:
+            steady = self.steady_state.update(sample.flows[HYDROGEN_INDEX] / total_flow, measured_value)
+            if steady is not None:
+                self.mixing_model.observe(*steady)
+                print(f"[Feedforward] Steady state {steady[1]:.0f} ppm at {steady[0] * 100:.2f} % H2; "
+                      f"model gain {self.mixing_model.gain:.0f} ppm, offset {self.mixing_model.offset:.0f} ppm")
+
+        if self.on_step is not None:
+            self.on_step(ControlStep(self.step_count, sample.timestamp, self.setpoint, measured_value,
+                                     hydrogen_flowrate, sample.ppm, sum(sample.flows), self.sequence_index))
+        self.step_count += 1
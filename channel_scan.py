@@ -0,0 +1,127 @@
+# channel_scan.py
+
+import time
+from collections import namedtuple
+from threading import Thread
+import numpy as np
+import adc_backend
+from hydrogensensor import HYDROGEN_CHANNEL
+from flowsensor import FLOW_CHANNEL
+from ring_buffer import TimestampedRingBuffer
+
+# One scanned input: ADC channel, PGA gain and data rate (samples per second)
+ScanChannel = namedtuple("ScanChannel", ["channel", "gain", "data_rate"])
+
+# Hydrogen sensor and reference flow sensor at the fastest ADS1115 rate
+SENSOR_CHANNELS = [
+    ScanChannel(HYDROGEN_CHANNEL, 2/3, 860),
+    ScanChannel(FLOW_CHANNEL, 2/3, 860),
+]
+
+
+class ChannelScanner:
+    """Round-robin scan of several ADC channels into one ring buffer per channel.
+
+    A single thread owns the converter while scanning and converts the
+    configured channels in turn, each with its own gain and data rate, as
+    fast as the converter allows (or at scan_rate scans per second). Each
+    sample is stamped with the time.monotonic() midpoint of its conversion,
+    so streams of different channels share one time base.
+
+    Do not run a scan while hydrogensensor's continuous reader is active;
+    both need the converter to themselves.
+    """
+
+    def __init__(self, channels=SENSOR_CHANNELS, scan_rate=None, capacity=8192):
+        self.channels = [channel if isinstance(channel, ScanChannel) else ScanChannel(channel, None, None)
+                         for channel in channels]
+        self.scan_rate = scan_rate  # None scans back to back
+        self.streams = {channel.channel: TimestampedRingBuffer(capacity) for channel in self.channels}
+        self.running = False
+        self.scans = 0
+        self.errors = 0
+        self._started_at = None
+        self._thread = None
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.scans = 0
+        self._started_at = time.monotonic()
+        self._thread = Thread(target=self._scan_loop, name="adc-channel-scan", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _scan_loop(self):
+        backend = adc_backend.get_backend()
+        next_scan = time.monotonic()
+        while self.running:
+            for channel in self.channels:
+                try:
+                    started = time.monotonic()
+                    voltage = backend.read_voltage(channel.channel, channel.gain, channel.data_rate)
+                    finished = time.monotonic()
+                except OSError as e:
+                    self.errors += 1
+                    print(f"Error reading ADC channel {channel.channel}: {e}")
+                    continue
+                self.streams[channel.channel].append((started + finished) / 2, voltage)
+            self.scans += 1
+
+            if self.scan_rate:
+                next_scan += 1.0 / self.scan_rate
+                delay = next_scan - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_scan = time.monotonic()  # Fell behind; do not burst
+
+    def stream(self, channel):
+        """Return the ring buffer of a channel."""
+        return self.streams[channel]
+
+    def latest(self, channel):
+        """Return the newest voltage of a channel, or None before the first sample."""
+        sample = self.streams[channel].latest()
+        return None if sample is None else float(sample[1])
+
+    def throughput(self):
+        """Return the achieved scan rate in full scans per second."""
+        if self._started_at is None:
+            return 0.0
+        elapsed = time.monotonic() - self._started_at
+        return self.scans / elapsed if elapsed > 0 else 0.0
+
+    def aligned(self, seconds, reference=None):
+        """Return the last given seconds of all channels on a common time base.
+
+        Returns (timestamps, {channel: values}); every other channel is
+        linearly interpolated onto the sample times of the reference channel
+        (the first scanned channel by default).
+        """
+        reference = self.channels[0].channel if reference is None else reference
+        timestamps, values = self.streams[reference].window(seconds)
+        series = {reference: values}
+        for channel, stream in self.streams.items():
+            if channel != reference:
+                channel_times, channel_values = stream.window(seconds)
+                series[channel] = (np.interp(timestamps, channel_times, channel_values)
+                                   if len(channel_times) else np.full(len(timestamps), np.nan))
+        return timestamps, series
+
+
+if __name__ == "__main__":
+    scanner = ChannelScanner()
+    scanner.start()
+    time.sleep(5)
+    scanner.stop()
+    print(f"{scanner.throughput():.1f} scans/s, {scanner.errors} read errors")
+    for channel in scanner.channels:
+        print(f"Channel {channel.channel}: {len(scanner.streams[channel.channel])} samples, "
+              f"latest {scanner.latest(channel.channel)} V")
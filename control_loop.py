@@ -0,0 +1,100 @@
+# control_loop.py
+
+import time
+from threading import Thread, Event
+from collections import namedtuple
+
+# Timing of a control loop run: iterations executed, periods skipped after
+# overruns, iterations that overran their period, and start jitter / step
+# durations in seconds
+LoopStats = namedtuple("LoopStats", ["iterations", "skipped", "overruns", "mean_jitter", "max_jitter",
+                                     "mean_duration", "max_duration"])
+
+
+class ControlLoop:
+    """Calls step() at a fixed period on the monotonic clock.
+
+    Iterations are scheduled on a fixed grid (start + n * period), so timing
+    errors do not accumulate. A step that runs past its period is counted as
+    an overrun and the periods it covered are skipped instead of being
+    caught up in a burst. The delay of every iteration start behind its
+    scheduled time is recorded as jitter.
+    """
+
+    def __init__(self, period, step, name="control-loop"):
+        self.period = period
+        self.step = step
+        self.name = name
+        self._stop_event = Event()
+        self._thread = None
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.iterations = 0
+        self.skipped = 0
+        self.overruns = 0
+        self._jitter_sum = 0.0
+        self._max_jitter = 0.0
+        self._duration_sum = 0.0
+        self._max_duration = 0.0
+
+    def run(self, duration=None, should_continue=None):
+        """Run the loop in the calling thread.
+
+        Returns after duration seconds (None runs until stopped), after
+        stop(), or once should_continue() returns False.
+        """
+        self._stop_event.clear()
+        self._reset_stats()
+        start = time.monotonic()
+        end = None if duration is None else start + duration
+        scheduled = start
+
+        while not self._stop_event.is_set() and (should_continue is None or should_continue()):
+            began = time.monotonic()
+            if end is not None and began >= end:
+                break
+            jitter = began - scheduled
+            self._jitter_sum += jitter
+            self._max_jitter = max(self._max_jitter, jitter)
+
+            self.step()
+
+            finished = time.monotonic()
+            step_duration = finished - began
+            self.iterations += 1
+            self._duration_sum += step_duration
+            self._max_duration = max(self._max_duration, step_duration)
+
+            scheduled += self.period
+            if finished > scheduled:
+                # Overran; resume on the next grid point still ahead
+                self.overruns += 1
+                missed = int((finished - scheduled) // self.period) + 1
+                self.skipped += missed
+                scheduled += missed * self.period
+
+            delay = scheduled - time.monotonic()
+            if end is not None:
+                delay = min(delay, end - time.monotonic())
+            if delay > 0:
+                self._stop_event.wait(delay)
+
+        return self.stats()
+
+    def start(self, duration=None):
+        """Run the loop on its own daemon thread."""
+        self._thread = Thread(target=self.run, args=(duration,), name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, wait=False):
+        self._stop_event.set()
+        if wait and self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        iterations = max(self.iterations, 1)
+        return LoopStats(self.iterations, self.skipped, self.overruns,
+                         self._jitter_sum / iterations, self._max_jitter,
+                         self._duration_sum / iterations, self._max_duration)
@@ -0,0 +1,237 @@
+# control_process.py
+#
+# Runs the automatic mode's sequence executor, control loop and device I/O in
+# a child process, so plot redraws and other GUI work in the main process
+# never delay a control step. The child publishes every control step into a
+# shared-memory ring buffer and takes commands over a pipe.
+
+import os
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+from automatic_control import AutomaticController, ControlStep, make_ppm_filter
+
+# Columns of a row in the shared ring buffer
+TELEMETRY_FIELDS = ControlStep._fields
+
+# Rows kept in the shared ring buffer (about 7 minutes at the control rate);
+# a reader that falls further behind loses the oldest rows
+RING_CAPACITY = 4096
+
+# Seconds to wait for the child to zero the flows and exit before killing it
+QUIT_TIMEOUT = 5.0
+
+
+class SharedRingBuffer:
+    """Fixed-size float64 rows in shared memory, one writer and any number of readers.
+
+    The first 8 bytes hold the number of rows ever written; row n lives in
+    slot n % capacity. The writer fills a slot before advancing the count,
+    and readers re-check the count after copying, so rows overwritten during
+    a read are dropped instead of returned torn. Create it without a name in
+    the owning process and attach with the name elsewhere.
+    """
+
+    def __init__(self, fields, capacity=RING_CAPACITY, name=None):
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        size = 8 + capacity * len(self.fields) * 8
+        if name is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self._count = np.ndarray((1,), dtype=np.int64, buffer=self._shm.buf)
+        self._rows = np.ndarray((capacity, len(self.fields)), dtype=np.float64, buffer=self._shm.buf, offset=8)
+        if name is None:
+            self._count[0] = 0
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    def count(self):
+        """Rows written so far."""
+        return int(self._count[0])
+
+    def write(self, row):
+        count = int(self._count[0])
+        self._rows[count % self.capacity] = row
+        self._count[0] = count + 1
+
+    def read_since(self, count):
+        """Return (rows, new count, rows lost) for all rows written after count."""
+        end = int(self._count[0])
+        start = max(count, end - self.capacity)
+        rows = self._rows[np.arange(start, end) % self.capacity]
+
+        # The writer may have lapped the oldest copied slots (and be filling
+        # the next one) while they were copied
+        first_valid = max(start, int(self._count[0]) - self.capacity + 1)
+        return rows[first_valid - start:], end, first_valid - count
+
+    def close(self):
+        # Drop the views before the mapping they point into
+        self._count = self._rows = None
+        self._shm.close()
+
+    def unlink(self):
+        self._shm.unlink()
+
+
+class ControlProcess:
+    """The main process's handle on a control child process.
+
+    The child opens the given controller ports itself, so the caller must
+    release them first (see ControllerRegistry.release()). cpu optionally
+    pins the child to one CPU core where the OS supports it.
+    """
+
+    def __init__(self, controller_ports, cpu=None):
+        self.telemetry = SharedRingBuffer(TELEMETRY_FIELDS)
+        self._read_count = 0
+        context = multiprocessing.get_context("spawn")  # No Tk state inherited from the GUI
+        self._conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_child_main, name="control-process", daemon=True,
+                                       args=(child_conn, self.telemetry.name, list(controller_ports), cpu))
+        self._close_lock = threading.Lock()
+
+    def start(self):
+        self.process.start()
+
+    def _send(self, command):
+        try:
+            self._conn.send(command)
+        except OSError as e:
+            # Closed, or the child is gone; it zeroes the flows on its way out
+            print(f"[Control process] Cannot send {command[0]}: {e}")
+
+    def run(self, sequence, settings):
+        """Start a sequence of (minutes, setpoint) pairs with automatic_control.ControlSettings."""
+        self._send(("start", list(sequence), settings))
+
+    def stop(self):
+        """End the running sequence; the child zeroes the flows."""
+        self._send(("stop",))
+
+    def zero_flows(self):
+        """Emergency stop: end any sequence and set every MFC to zero flow."""
+        self._send(("zero",))
+
+    def events(self):
+        """Return the messages the child sent since the last call.
+
+        ("ready",), ("finished", completed) and ("error", message) tuples. A
+        child that cannot open every port sends an error instead of ready
+        and exits.
+        """
+        events = []
+        try:
+            while self._conn.poll():
+                events.append(self._conn.recv())
+        except (EOFError, OSError):
+            if not self.process.is_alive():
+                events.append(("error", f"Control process exited with code {self.process.exitcode}"))
+        return events
+
+    def read_steps(self):
+        """Return the ControlSteps published since the last call and how many were lost."""
+        rows, self._read_count, lost = self.telemetry.read_since(self._read_count)
+        if lost:
+            print(f"[Control process] {lost} telemetry rows overwritten before they were read")
+        return [ControlStep(int(row[0]), *row[1:-1].tolist(), int(row[-1])) for row in rows], lost
+
+    def close(self, timeout=QUIT_TIMEOUT):
+        """Have the child zero the flows and close its ports, then free the shared memory.
+
+        Safe to call more than once and from any thread.
+        """
+        with self._close_lock:
+            if self._conn.closed:
+                return
+            try:
+                self._conn.send(("quit",))
+            except (BrokenPipeError, OSError):
+                pass
+            if self.process.pid is not None:
+                self.process.join(timeout)
+                if self.process.is_alive():
+                    print("[Control process] Did not exit in time, terminating it")
+                    self.process.terminate()
+                    self.process.join()
+            self._conn.close()
+            self.telemetry.close()
+            self.telemetry.unlink()
+
+
+def _child_main(conn, telemetry_name, controller_ports, cpu):
+    """Entry point of the control process."""
+    if cpu is not None and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, {cpu})
+        except OSError as e:
+            print(f"[Control process] Cannot pin to CPU {cpu}: {e}")
+
+    # Imported here so the parent does not open anything on import
+    from controller import registry
+    from sampling_service import SamplingService
+    if os.environ.get("SFC_EMULATOR"):
+        import shdlc_emulator
+        shdlc_emulator.install()
+
+    send_lock = threading.Lock()
+
+    def send(message):
+        with send_lock:
+            conn.send(message)
+
+    telemetry = SharedRingBuffer(TELEMETRY_FIELDS, name=telemetry_name)
+    controllers = [registry.get(port) for port in controller_ports]
+    missing = [controller.port for controller in controllers if not controller.is_connected()]
+    if missing:
+        send(("error", f"Could not open device on port {', '.join(missing)}"))
+        registry.close_all()
+        telemetry.close()
+        conn.close()
+        return
+    sampler = SamplingService(controllers, ppm_filter=make_ppm_filter())
+    engine = AutomaticController(controllers, sampler, on_step=telemetry.write)
+    sampler.start()
+    send(("ready",))
+
+    def run(sequence, settings):
+        try:
+            send(("finished", engine.run(sequence, settings)))
+        except Exception as e:
+            send(("error", str(e)))
+
+    run_thread = None
+    try:
+        while True:
+            try:
+                command = conn.recv()
+            except EOFError:
+                break  # The main process is gone; shut down safely
+            name = command[0]
+            if name == "start":
+                if run_thread is not None and run_thread.is_alive():
+                    send(("error", "A sequence is already running"))
+                    continue
+                run_thread = threading.Thread(target=run, args=command[1:], name="control-run", daemon=True)
+                run_thread.start()
+            elif name == "stop":
+                engine.stop()
+            elif name == "zero":
+                engine.stop()
+                engine.zero_all_flows()
+            elif name == "quit":
+                break
+    finally:
+        engine.stop()
+        if run_thread is not None:
+            run_thread.join()
+        engine.zero_all_flows()
+        sampler.stop(wait=True)
+        registry.close_all()
+        telemetry.close()
+        conn.close()
@@ -1,118 +1,527 @@
-# controller.py
-
-import time
-from threading import Thread
-from sensirion_shdlc_driver import ShdlcSerialPort, ShdlcConnection
-from sensirion_shdlc_sfc5xxx import Sfc5xxxShdlcDevice, Sfc5xxxScaling, \
-    Sfc5xxxUnitPrefix, Sfc5xxxUnit, Sfc5xxxUnitTimeBase, Sfc5xxxMediumUnit
-
-
-class FlowController:
-    def __init__(self, port, baudrate=115200, slave_address=0, timeout=5):
-        self.port = port
-        self.baudrate = baudrate
-        self.slave_address = slave_address
-        self.timeout = timeout
-        self.device = None
-        self.unit = None
-        self.serial_port = None
-
-    def connect(self):
-        try:
-            self.serial_port = ShdlcSerialPort(port=self.port, baudrate=self.baudrate)
-            self.device = Sfc5xxxShdlcDevice(ShdlcConnection(self.serial_port), slave_address=self.slave_address)
-
-            # Set gas calibration 0
-            # self.device.activate_calibration(0)
-
-            # Set user-defined flow unit to sccm
-            self.unit = Sfc5xxxMediumUnit(
-                Sfc5xxxUnitPrefix.MILLI,
-                Sfc5xxxUnit.STANDARD_LITER,
-                Sfc5xxxUnitTimeBase.MINUTE
-            )
-            self.device.set_user_defined_medium_unit(self.unit)
-
-        except Exception as e:
-            print(f"Error connecting to device on port {self.port}: {e}")
-            
-    def is_connected(self):
-        """Return whether the controller is connected."""
-        return self.connected
-
-    def set_flow_rate(self, flow_rate):
-        try:
-            if self.device:
-                self.device.set_setpoint(flow_rate, Sfc5xxxScaling.USER_DEFINED)
-        except Exception as e:
-            print(f"Error setting flow rate on port {self.port}: {e}")
-
-    def set_flow_rate_with_retries(self, flow_rate, retries=3, timeout=500):
-        """Set the flow rate with retries in case of failure."""
-        for attempt in range(retries):
-            try:
-                # Increase timeout for SHDLC communication, if supported by your library
-                self.device.set_setpoint(flow_rate, Sfc5xxxScaling.USER_DEFINED)
-                return  # Success
-            except Exception as e:
-                if attempt < retries - 1:
-                    time.sleep(1)  # Wait before retrying
-                else:
-                    # If all retries fail, raise the exception
-                    raise ConnectionError(f"Failed to set flow rate after {retries} attempts: {e}")
-            except KeyboardInterrupt:
-                print("Process interrupted by user.")
-                raise
-    
-    def get_measured_flow(self):
-        try:
-            if self.device:
-                return self.device.read_measured_value(Sfc5xxxScaling.USER_DEFINED)
-                
-        except Exception as e:
-            error_message = str(e)
-            if "SHDLC device with address 0 is in error state" in error_message:
-                print("Connection Lost!")
-            else:
-                print(f"Error reading measured flow on port {self.port}: {error_message}")
-        return 0
-
-
-    
-    def get_current_gas_id(self):
-        try:
-            if self.device:
-                return self.device.get_current_gas_description(Sfc5xxxScaling.USER_DEFINED)  
-        except Exception as e:
-            print(f"Error reading gas ID on port {self.port}: {e}")
-        return None
-    
-        
-    
-    def get_current_setpoint(self):
-        try:
-            if self.device:
-                return self.device.get_setpoint(Sfc5xxxScaling.USER_DEFINED)
-        except Exception as e:
-            print(f"Error reading current setpoint on port {self.port}: {e}")
-        return 0
-
-    def set_flow_rate_to_zero(self):
-        try:
-            if self.device:
-                self.device.set_setpoint(0, Sfc5xxxScaling.USER_DEFINED)
-        except Exception as e:
-            print(f"Error setting flow rate to zero: {e}")
-
-    def start_monitoring(self, gui_update_callback):
-        """Monitor flow rates and update the GUI."""
-        self.monitoring_active = True  # Set monitoring as active
-
-        def monitor():
-            while self.monitoring_active:
-                flow = self.get_measured_flow()
-                setpoint = self.get_current_setpoint()
-                gui_update_callback(flow, setpoint)
-                time.sleep(0.5)
-
-        Thread(target=monitor, daemon=True).start()
\ No newline at end of file
+# controller.py
+
+import time
+from collections import deque, namedtuple
+from concurrent.futures import Future
+from threading import Thread, Lock, RLock, Condition, current_thread
+import numpy as np
+from retry_policy import RetryPolicy, CircuitBreaker, call_with_retries
+from sensirion_shdlc_driver import ShdlcSerialPort, ShdlcConnection
+from sensirion_shdlc_sfc5xxx import Sfc5xxxShdlcDevice, Sfc5xxxScaling, \
+    Sfc5xxxUnitPrefix, Sfc5xxxUnit, Sfc5xxxUnitTimeBase, Sfc5xxxMediumUnit
+
+# Flow samples drained from the device buffer: timestamps (s, epoch) and
+# values (sccm) as NumPy arrays, plus the count of samples lost to overrun
+FlowTrace = namedtuple("FlowTrace", ["timestamps", "values", "lost_values"])
+
+# Measured flow, setpoint (sccm) and device status read in one batch;
+# timestamp is time.monotonic() when the batch completed
+FlowSnapshot = namedtuple("FlowSnapshot", ["timestamp", "flow", "setpoint", "device_state"])
+
+# Extra SHDLC ports by name, e.g. emulated devices; maps a port name to a
+# factory taking the baudrate and returning an ShdlcPort
+PORT_FACTORIES = {}
+
+
+def open_shdlc_port(port, baudrate):
+    """Open a registered extra port by name, otherwise a serial port."""
+    factory = PORT_FACTORIES.get(port)
+    if factory is not None:
+        return factory(baudrate)
+    return ShdlcSerialPort(port=port, baudrate=baudrate)
+
+
+# Default deadband (sccm) for setpoint writes of registry controllers
+DEFAULT_SETPOINT_DEADBAND = 0.05
+
+
+class PortWorker:
+    """Single I/O thread that owns all SHDLC traffic to one serial port.
+
+    Reads and other commands are executed in the order they were queued.
+    Setpoint writes go into a single slot instead, so a write that is
+    superseded before it was sent is dropped in favour of the newer one.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._cond = Condition()
+        self._requests = deque()
+        self._pending_setpoint = None  # (futures, func, args)
+        self._running = True
+        self._thread = Thread(target=self._run, name=f"shdlc-io-{name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, func, *args):
+        """Queue a call on the I/O thread and return a Future for its result."""
+        future = Future()
+        with self._cond:
+            if not self._running:
+                future.set_exception(ConnectionError(f"I/O worker for {self.name} is stopped."))
+                return future
+            self._requests.append(([future], func, args))
+            self._cond.notify()
+        return future
+
+    def submit_setpoint(self, func, *args):
+        """Queue a setpoint write, replacing any write that has not been sent yet.
+
+        Futures of superseded writes resolve together with the write that
+        replaced them.
+        """
+        future = Future()
+        with self._cond:
+            if not self._running:
+                future.set_exception(ConnectionError(f"I/O worker for {self.name} is stopped."))
+                return future
+            futures = [future]
+            if self._pending_setpoint is not None:
+                futures = self._pending_setpoint[0] + futures
+            self._pending_setpoint = (futures, func, args)
+            self._cond.notify()
+        return future
+
+    def stop(self, timeout=None):
+        """Send the remaining queued requests, then stop the I/O thread."""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not current_thread():
+            self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not self._requests and self._pending_setpoint is None:
+                    self._cond.wait()
+                # Setpoints go out first so the newest value has minimum latency
+                if self._pending_setpoint is not None:
+                    futures, func, args = self._pending_setpoint
+                    self._pending_setpoint = None
+                elif self._requests:
+                    futures, func, args = self._requests.popleft()
+                else:
+                    return  # Stopped and drained
+
+            # Requests cancelled while queued are never sent
+            futures = [future for future in futures if future.set_running_or_notify_cancel()]
+            if not futures:
+                continue
+
+            try:
+                result = func(*args)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+            else:
+                for future in futures:
+                    future.set_result(result)
+
+
+class FlowController:
+    def __init__(self, port, baudrate=115200, slave_address=0, timeout=5, setpoint_deadband=0.0,
+                 snapshot_ttl=0.1):
+        self.port = port
+        self.baudrate = baudrate
+        self.slave_address = slave_address
+        self.timeout = timeout
+        # Setpoint writes closer than this (sccm) to the last acknowledged
+        # setpoint are skipped
+        self.setpoint_deadband = setpoint_deadband
+        self.last_setpoint = None
+        self.worker = None
+        self.buffer_active = False
+        self._last_buffer_timestamp = None
+        self.retry_policy = RetryPolicy(attempt_timeout=timeout)
+        self.breaker = CircuitBreaker()
+        # Snapshots younger than snapshot_ttl seconds are shared between
+        # consumers instead of being read again
+        self.snapshot_ttl = snapshot_ttl
+        self._snapshot = None
+        self._snapshot_future = None
+        self._snapshot_lock = RLock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.device = None
+        self.unit = None
+        self.serial_port = None
+        self.serial_number = None
+        self.connected = False
+        self.monitoring_active = False
+
+    def connect(self):
+        try:
+            self.serial_port = open_shdlc_port(self.port, self.baudrate)
+            self.device = Sfc5xxxShdlcDevice(ShdlcConnection(self.serial_port), slave_address=self.slave_address)
+            self.serial_number = self.device.get_serial_number()
+
+            # Set gas calibration 0
+            # self.device.activate_calibration(0)
+
+            # Set user-defined flow unit to sccm. The unit is stored permanently
+            # in the device, so only write it when it differs.
+            unit = Sfc5xxxMediumUnit(
+                Sfc5xxxUnitPrefix.MILLI,
+                Sfc5xxxUnit.STANDARD_LITER,
+                Sfc5xxxUnitTimeBase.MINUTE
+            )
+            if self.device.get_user_defined_medium_unit() != unit:
+                self.device.set_user_defined_medium_unit(unit)
+            self.unit = unit
+            self.last_setpoint = None
+            self.worker = PortWorker(self.port)
+            self.connected = True
+
+        except Exception as e:
+            print(f"Error connecting to device on port {self.port}: {e}")
+            self.close()
+        return self.connected
+
+    def close(self):
+        """Close the serial port of this controller."""
+        self.connected = False
+        if self.worker is not None:
+            self.worker.stop(self.timeout)
+            self.worker = None
+        self.device = None
+        if self.serial_port is not None:
+            try:
+                self.serial_port.close()
+            except Exception as e:
+                print(f"Error closing port {self.port}: {e}")
+            self.serial_port = None
+
+    def is_connected(self):
+        """Return whether the controller is connected."""
+        return self.connected
+
+    def _call(self, func, *args):
+        """Run a device call on the port's I/O thread and wait for the result."""
+        return self.worker.submit(func, *args).result(timeout=self.timeout)
+
+    def _write_setpoint(self, flow_rate):
+        """Write a setpoint unless it is within the deadband of the acknowledged one.
+
+        Runs on the I/O thread, so it always compares against the latest
+        acknowledged value. A zero setpoint is always sent exactly.
+        """
+        last = self.last_setpoint
+        if last is not None and abs(flow_rate - last) <= self.setpoint_deadband \
+                and (flow_rate != 0 or last == 0):
+            return last
+        self.device.set_setpoint(flow_rate, Sfc5xxxScaling.USER_DEFINED)
+        self.last_setpoint = flow_rate
+        with self._snapshot_lock:
+            self._snapshot = None  # The cached setpoint is stale now
+        return flow_rate
+
+    def set_flow_rate(self, flow_rate, wait=False):
+        """Queue a new setpoint; returns a Future, or waits for the write if wait is True."""
+        if not self.device:
+            return None
+        future = self.worker.submit_setpoint(self._write_setpoint, flow_rate)
+        if wait:
+            try:
+                future.result(timeout=self.timeout)
+            except Exception as e:
+                print(f"Error setting flow rate on port {self.port}: {e}")
+        else:
+            future.add_done_callback(self._report_setpoint_error)
+        return future
+
+    def _report_setpoint_error(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            print(f"Error setting flow rate on port {self.port}: {future.exception()}")
+
+    def set_flow_rate_with_retries(self, flow_rate, callback=None, policy=None):
+        """Set the flow rate under the retry policy without blocking the caller.
+
+        Returns a Future; if a callback is given it is called with that Future
+        once the write succeeded or finally failed. Failures count towards the
+        controller's circuit breaker.
+        """
+        def attempt():
+            if not self.device:
+                raise ConnectionError(f"Device on port {self.port} is not connected.")
+            return self.worker.submit_setpoint(self._write_setpoint, flow_rate)
+
+        future = call_with_retries(attempt, policy or self.retry_policy, self.breaker,
+                                   description=f"Setting flow rate on port {self.port}")
+        if callback is not None:
+            future.add_done_callback(callback)
+        return future
+
+    @property
+    def healthy(self):
+        """Return False once the circuit breaker marked the device unhealthy."""
+        return self.breaker.healthy
+
+    def request_measured_flow(self):
+        """Queue a flow read on the port's I/O thread and return its Future."""
+        if not self.device:
+            future = Future()
+            future.set_exception(ConnectionError(f"Device on port {self.port} is not connected."))
+            return future
+        return self.worker.submit(self.device.read_measured_value, Sfc5xxxScaling.USER_DEFINED)
+
+    def _read_snapshot(self):
+        """Read flow, setpoint and status back to back on the I/O thread."""
+        flow = self.device.read_measured_value(Sfc5xxxScaling.USER_DEFINED)
+        setpoint = self.device.get_setpoint(Sfc5xxxScaling.USER_DEFINED)
+        device_state, _ = self.device.read_device_status(clear=False)
+        return FlowSnapshot(time.monotonic(), flow, setpoint, device_state)
+
+    def _cached_snapshot(self):
+        """Return the cached snapshot if it is younger than snapshot_ttl, counting the hit."""
+        with self._snapshot_lock:
+            cached = self._snapshot
+            if cached is not None and time.monotonic() - cached.timestamp < self.snapshot_ttl:
+                self.cache_hits += 1
+                return cached
+        return None
+
+    def snapshot(self):
+        """Return a FlowSnapshot of measured flow, setpoint and device state.
+
+        All three values are read as one batch on the port's I/O thread.
+        Consumers asking within snapshot_ttl of each other, or while a batch
+        is already in flight, share the same bus transaction.
+        """
+        if not self.device:
+            return None
+        with self._snapshot_lock:
+            cached = self._cached_snapshot()
+            if cached is not None:
+                return cached
+            if self._snapshot_future is not None and not self._snapshot_future.done():
+                self.cache_hits += 1
+                future = self._snapshot_future
+            else:
+                self.cache_misses += 1
+                future = self._snapshot_future = self.worker.submit(self._read_snapshot)
+
+        try:
+            snapshot = future.result(timeout=self.timeout)
+        except Exception as e:
+            print(f"Error reading snapshot on port {self.port}: {e}")
+            return None
+        with self._snapshot_lock:
+            if self._snapshot is None or snapshot.timestamp > self._snapshot.timestamp:
+                self._snapshot = snapshot
+        return snapshot
+
+    def cache_stats(self):
+        """Return (hits, misses) of the snapshot cache."""
+        return self.cache_hits, self.cache_misses
+
+    def get_measured_flow(self):
+        cached = self._cached_snapshot()
+        if cached is not None:
+            return cached.flow
+        try:
+            if self.device:
+                with self._snapshot_lock:
+                    self.cache_misses += 1
+                return self._call(self.device.read_measured_value, Sfc5xxxScaling.USER_DEFINED)
+                
+        except Exception as e:
+            error_message = str(e)
+            if "SHDLC device with address 0 is in error state" in error_message:
+                print("Connection Lost!")
+            else:
+                print(f"Error reading measured flow on port {self.port}: {error_message}")
+        return 0
+
+
+    
+    def get_current_gas_id(self):
+        try:
+            if self.device:
+                return self._call(self.device.get_current_gas_description)
+        except Exception as e:
+            print(f"Error reading gas ID on port {self.port}: {e}")
+        return None
+
+    def read_serial_number(self):
+        """Read the serial number of the device now answering on the port."""
+        try:
+            if self.device:
+                return self._call(self.device.get_serial_number)
+        except Exception as e:
+            print(f"Error reading serial number on port {self.port}: {e}")
+        return None
+
+        
+    
+    def get_current_setpoint(self):
+        cached = self._cached_snapshot()
+        if cached is not None:
+            return cached.setpoint
+        try:
+            if self.device:
+                with self._snapshot_lock:
+                    self.cache_misses += 1
+                return self._call(self.device.get_setpoint, Sfc5xxxScaling.USER_DEFINED)
+        except Exception as e:
+            print(f"Error reading current setpoint on port {self.port}: {e}")
+        return 0
+
+    def set_flow_rate_to_zero(self):
+        """Set the flow rate to zero and wait until the device acknowledged it."""
+        if self.device:
+            self.set_flow_rate(0, wait=True)
+
+    def read_flow_buffer(self, max_reads=100):
+        """Drain the device's measured-value buffer and return a FlowTrace.
+
+        The SFC5xxx records flow at its internal sampling interval; one drain
+        returns every sample since the previous call in a few SHDLC frames.
+        Timestamps continue from the previous drain unless samples were lost.
+        """
+        empty = FlowTrace(np.empty(0), np.empty(0), 0)
+        try:
+            if not self.device:
+                return empty
+            response = self._call(self.device.read_measured_value_buffer,
+                                  Sfc5xxxScaling.USER_DEFINED, max_reads)
+        except Exception as e:
+            print(f"Error reading flow buffer on port {self.port}: {e}")
+            return empty
+
+        read_time = time.time()
+        values = np.asarray(response.values, dtype=float)
+        count = len(values)
+        if count == 0:
+            return FlowTrace(np.empty(0), values, response.lost_values)
+
+        period = response.sampling_time
+        if response.lost_values == 0 and self._last_buffer_timestamp is not None:
+            first = self._last_buffer_timestamp + period
+        else:
+            # Anchor the newest sample to the time the buffer was read
+            first = read_time - period * (count - 1)
+        timestamps = first + period * np.arange(count)
+        self._last_buffer_timestamp = timestamps[-1]
+
+        if response.lost_values:
+            print(f"Flow buffer on port {self.port} overran, {response.lost_values} samples lost")
+        return FlowTrace(timestamps, values, response.lost_values)
+
+    def start_buffered_acquisition(self, trace_callback, interval=0.5):
+        """Drain the flow buffer every interval seconds and pass each FlowTrace to the callback."""
+        self.buffer_active = True
+        self._last_buffer_timestamp = None
+        self.read_flow_buffer()  # Discard samples recorded before the start
+
+        def acquire():
+            while self.buffer_active:
+                time.sleep(interval)
+                trace = self.read_flow_buffer()
+                if len(trace.values):
+                    trace_callback(trace)
+
+        Thread(target=acquire, daemon=True).start()
+
+    def stop_buffered_acquisition(self):
+        self.buffer_active = False
+
+    def start_monitoring(self, gui_update_callback):
+        """Monitor flow rates and update the GUI."""
+        self.monitoring_active = True  # Set monitoring as active
+
+        def monitor():
+            while self.monitoring_active:
+                snapshot = self.snapshot()
+                if snapshot is not None:
+                    gui_update_callback(snapshot.flow, snapshot.setpoint)
+                time.sleep(0.5)
+
+        Thread(target=monitor, daemon=True).start()
+
+
+def read_flows(controllers, timeout=5):
+    """Read the measured flow of several controllers in parallel.
+
+    All reads are queued before any result is awaited, so devices on
+    different ports are polled concurrently and one cycle takes about as
+    long as the slowest single read. Failed reads are returned as 0.
+    """
+    futures = [controller.request_measured_flow() for controller in controllers]
+    flows = []
+    for controller, future in zip(controllers, futures):
+        try:
+            flows.append(future.result(timeout=timeout))
+        except Exception as e:
+            print(f"Error reading measured flow on port {controller.port}: {e}")
+            flows.append(0)
+    return flows
+
+
+def set_flow_rates(controllers, flow_rates):
+    """Queue one setpoint per controller; returns the write Futures."""
+    return [controller.set_flow_rate(flow_rate) for controller, flow_rate in zip(controllers, flow_rates)]
+
+
+class ControllerRegistry:
+    """Process-wide registry of open flow controllers, keyed by port and serial number.
+
+    Each SFC5xxx is opened once and the same live FlowController is handed to
+    every mode. Ports are only closed by close_all() at application exit, or
+    released for a while to let the control process open them.
+    """
+
+    def __init__(self, setpoint_deadband=DEFAULT_SETPOINT_DEADBAND):
+        self.setpoint_deadband = setpoint_deadband
+        self._controllers = {}  # (port, serial_number) -> FlowController
+        self._lock = Lock()
+
+    def get(self, port, serial_number=None):
+        """Return the connected controller on a port, opening it on first use.
+
+        With a serial number, a controller registered for a different device
+        on the port is closed and the port opened again.
+        """
+        with self._lock:
+            for (registered_port, registered_serial), controller in list(self._controllers.items()):
+                if registered_port != port:
+                    continue
+                if serial_number is None or registered_serial == serial_number:
+                    return controller
+                # A different device is now plugged into this port
+                controller.close()
+                del self._controllers[(registered_port, registered_serial)]
+
+            controller = FlowController(port=port, setpoint_deadband=self.setpoint_deadband)
+            if controller.connect():
+                self._controllers[(port, controller.serial_number)] = controller
+            return controller
+
+    def find_by_serial(self, serial_number):
+        """Return the registered controller with the given serial number, or None."""
+        with self._lock:
+            for (_, registered_serial), controller in self._controllers.items():
+                if registered_serial == serial_number:
+                    return controller
+        return None
+
+    def release(self, port):
+        """Close and forget the controller on a port; the next get() opens it again."""
+        with self._lock:
+            for key in [key for key in self._controllers if key[0] == port]:
+                controller = self._controllers.pop(key)
+                controller.monitoring_active = False
+                controller.buffer_active = False
+                controller.close()
+
+    def close_all(self):
+        """Stop all controllers and close their ports."""
+        with self._lock:
+            for controller in self._controllers.values():
+                controller.monitoring_active = False
+                controller.buffer_active = False
+                controller.close()
+            self._controllers.clear()
+
+
+# Shared registry used by the start window and all modes
+registry = ControllerRegistry()
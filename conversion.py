@@ -0,0 +1,104 @@
+# conversion.py
+#
+# Calibrations that turn ADC voltages into physical values. Every calibration
+# converts a scalar or a whole NumPy array in one call; for the hot path a
+# calibration can be compiled into a dense lookup table that is evaluated with
+# linear interpolation instead of the exact formula.
+
+import numpy as np
+
+
+class Calibration:
+    """Base class: converts voltages into physical values."""
+
+    def convert(self, voltages):
+        """Convert an array of voltages; returns a float array of the same shape."""
+        raise NotImplementedError()
+
+    def __call__(self, voltage):
+        """Convert a scalar (returns float) or an array (returns array)."""
+        values = self.convert(np.asarray(voltage, dtype=float))
+        return float(values) if np.ndim(values) == 0 else values
+
+    def lookup_table(self, in_min, in_max, points=4096):
+        """Return this calibration precomputed over [in_min, in_max]."""
+        return LookupTableCalibration(self, in_min, in_max, points)
+
+
+class PolynomialCalibration(Calibration):
+    """Polynomial in the voltage, coefficients highest power first (as np.polyval)."""
+
+    def __init__(self, coefficients):
+        self.coefficients = np.asarray(coefficients, dtype=float)
+
+    def convert(self, voltages):
+        # Horner's scheme over the whole array
+        values = np.full(np.shape(voltages), self.coefficients[0])
+        for coefficient in self.coefficients[1:]:
+            values = values * voltages + coefficient
+        return values
+
+
+class LinearCalibration(Calibration):
+    """Straight line from (in_min, out_min) to (in_max, out_max).
+
+    Voltages below in_min read as out_min; voltages above in_max are
+    extrapolated unless clamp_high is set.
+    """
+
+    def __init__(self, in_min, in_max, out_min=0.0, out_max=1.0, clamp_high=False):
+        if in_max == in_min:
+            raise ValueError("in_min and in_max must differ.")
+        self.in_min = in_min
+        self.in_max = in_max
+        self.out_min = out_min
+        self.out_max = out_max
+        self.clamp_high = clamp_high
+        self._slope = (out_max - out_min) / (in_max - in_min)
+
+    def convert(self, voltages):
+        upper = self.in_max if self.clamp_high else np.inf
+        return (np.clip(voltages, self.in_min, upper) - self.in_min) * self._slope + self.out_min
+
+
+class PiecewiseCalibration(Calibration):
+    """Linear interpolation between measured (voltage, value) points.
+
+    Voltages outside the measured range read as the first or last value.
+    """
+
+    def __init__(self, voltages, values):
+        order = np.argsort(voltages)
+        self.voltages = np.asarray(voltages, dtype=float)[order]
+        self.values = np.asarray(values, dtype=float)[order]
+        if len(self.voltages) < 2:
+            raise ValueError("A piecewise calibration needs at least two points.")
+
+    def convert(self, voltages):
+        return np.interp(voltages, self.voltages, self.values)
+
+
+class LookupTableCalibration(Calibration):
+    """Another calibration sampled on a dense, evenly spaced voltage grid.
+
+    Inside [in_min, in_max] values are interpolated from the table by index
+    arithmetic; outside it the exact calibration is used.
+    """
+
+    def __init__(self, calibration, in_min, in_max, points=4096):
+        self.calibration = calibration
+        self.in_min = float(in_min)
+        self.in_max = float(in_max)
+        self.grid = np.linspace(self.in_min, self.in_max, points)
+        self.table = calibration.convert(self.grid)
+        self._scale = (points - 1) / (self.in_max - self.in_min)
+
+    def convert(self, voltages):
+        position = (voltages - self.in_min) * self._scale
+        index = np.clip(position.astype(np.intp), 0, len(self.table) - 2)
+        values = self.table[index]
+        values += (self.table[index + 1] - values) * (position - index)
+        outside = (voltages < self.in_min) | (voltages > self.in_max)
+        if np.any(outside):
+            values = np.where(outside, self.calibration.convert(voltages), values)
+        return values
@@ -0,0 +1,143 @@
+# feedforward.py
+
+import json
+import os
+import time
+from collections import deque
+import numpy as np
+from rig_config import HYDROGEN_SOURCE_PPM
+
+# Where the automatic mode keeps the calibrated model between sessions: the
+# user's data directory, so runs never write into the source tree
+DATA_DIR = os.path.join(os.environ.get("APPDATA") or os.environ.get("XDG_DATA_HOME")
+                        or os.path.expanduser(os.path.join("~", ".local", "share")), "hydrogendispatchsystem")
+MODEL_FILE = os.path.join(DATA_DIR, "mixing_model.json")
+
+
+class MixingModel:
+    """Steady-state ppm reading for a hydrogen fraction: ppm = gain * fraction + offset.
+
+    Starts from the physics (only source gas gives HYDROGEN_SOURCE_PPM, no
+    offset) and refines gain and offset by recursive least squares from observed steady
+    states. The prior uncertainties say how far the rig may be from the
+    physics; forgetting lets the model follow slow sensor drift.
+    """
+
+    def __init__(self, gain=HYDROGEN_SOURCE_PPM, offset=0.0, gain_uncertainty=4000.0, offset_uncertainty=500.0,
+                 measurement_noise=50.0, forgetting=0.95):
+        self.theta = np.array([gain, offset], dtype=float)
+        self.covariance = np.diag([gain_uncertainty ** 2, offset_uncertainty ** 2])
+        self.measurement_variance = measurement_noise ** 2
+        self.forgetting = forgetting
+        self.observations = 0
+
+    @property
+    def gain(self):
+        return float(self.theta[0])
+
+    @property
+    def offset(self):
+        return float(self.theta[1])
+
+    def fraction_for(self, ppm):
+        """Return the hydrogen fraction (0-1) expected to give the ppm reading."""
+        return min(1.0, max(0.0, (ppm - self.offset) / self.gain))
+
+    def control_signal(self, ppm):
+        """Return the hydrogen share of the total flow in percent for a ppm target."""
+        return 100 * self.fraction_for(ppm)
+
+    def observe(self, fraction, ppm):
+        """Refine the model with a steady-state (fraction, ppm) pair."""
+        x = np.array([fraction, 1.0])
+        spread = x @ self.covariance @ x + self.measurement_variance
+        gain_vector = self.covariance @ x / spread
+        self.theta = self.theta + gain_vector * (ppm - x @ self.theta)
+        self.covariance = (self.covariance - np.outer(gain_vector, x @ self.covariance)) / self.forgetting
+        self.observations += 1
+
+    def to_dict(self):
+        return {"theta": self.theta.tolist(), "covariance": self.covariance.tolist(),
+                "observations": self.observations}
+
+    def save(self, path=MODEL_FILE):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+    @classmethod
+    def load(cls, path=MODEL_FILE, **options):
+        """Return the saved model, or a fresh one if there is none or it is unreadable."""
+        model = cls(**options)
+        try:
+            with open(path) as file:
+                data = json.load(file)
+            model.theta = np.array(data["theta"], dtype=float)
+            model.covariance = np.array(data["covariance"], dtype=float)
+            model.observations = int(data["observations"])
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring mixing model in {path}: {e}")
+        return model
+
+
+class ReferenceTrajectory:
+    """The reading expected while the gas settles after a setpoint change.
+
+    With feedforward setting the flow split, the PID should only correct
+    deviations from the expected first-order approach to the setpoint, not
+    the transport and sensor lag itself, or its integral winds up on every
+    step and overshoots.
+    """
+
+    def __init__(self, time_constant=20.0):
+        self.time_constant = time_constant
+        self.value = None
+
+    def reset(self, value=None):
+        """Start from value (e.g. the current reading) or jump to the next setpoint."""
+        self.value = value
+
+    def update(self, setpoint, dt):
+        """Advance by dt seconds towards setpoint and return the expected reading."""
+        if self.value is None:
+            self.value = setpoint
+        else:
+            self.value += (setpoint - self.value) * min(1.0, dt / self.time_constant)
+        return self.value
+
+
+class SteadyStateDetector:
+    """Reports a (fraction, ppm) pair once both held still for a while.
+
+    The ppm reading counts as steady when its standard deviation over the
+    last window seconds stays within tolerance ppm, and the hydrogen
+    fraction as steady when it moved less than fraction_tolerance. After a
+    report the window starts over, so one plateau yields one observation
+    per window.
+    """
+
+    def __init__(self, window=30.0, tolerance=100.0, fraction_tolerance=0.002):
+        self.window = window
+        self.tolerance = tolerance
+        self.fraction_tolerance = fraction_tolerance
+        self._samples = deque()
+
+    def reset(self):
+        self._samples.clear()
+
+    def update(self, fraction, ppm, now=None):
+        """Add a sample; returns (fraction, ppm) averages when steady, else None."""
+        now = time.monotonic() if now is None else now
+        self._samples.append((now, fraction, ppm))
+        while self._samples and now - self._samples[0][0] > self.window:
+            self._samples.popleft()
+        if now - self._samples[0][0] < self.window * 0.9:
+            return None
+
+        _, fractions, readings = zip(*self._samples)
+        if max(fractions) - min(fractions) > self.fraction_tolerance or np.std(readings) > self.tolerance:
+            return None
+        self._samples.clear()
+        return float(np.mean(fractions)), float(np.mean(readings))
@@ -0,0 +1,83 @@
+# flow_sequence.py
+#
+# The semi-manual mode's open-loop run without any GUI: applies the flow
+# rates of each (minutes, flow per MFC...) row at its deadline, with retried
+# setpoint writes. Used by the semi-manual mode window and run_sequence.py.
+
+from rig_config import MFCS
+from sequence_scheduler import SequenceScheduler, compile_schedule
+
+
+def describe_flows(flow_rates):
+    """Return the flow rates of a step as 'name: rate sccm' per MFC."""
+    return " | ".join(f"{mfc.name}: {flow_rate} sccm" for mfc, flow_rate in zip(MFCS, flow_rates))
+
+
+class FlowSequenceRunner:
+    """Runs a flow sequence open loop on the MFCs.
+
+    Each row's setpoints are queued with retries when its step is due on
+    the scheduler thread. A setpoint that still fails after the retries is
+    passed to on_failure(error_message, exception) from an I/O thread, and
+    on_finish() is called on the scheduler thread once the last step has
+    run for its duration; neither may wait on a GUI thread. stop() cancels
+    the remaining steps and retries and sets all flows to zero.
+    """
+
+    def __init__(self, controllers, rows, on_failure=None, on_finish=None):
+        self.controllers = controllers
+        self.rows = rows
+        self.on_failure = on_failure
+        self.on_finish = on_finish
+        self.offsets, self.total_time = compile_schedule(row[0] * 60 for row in rows)
+        self.current_step = None
+        self.scheduler = None
+        # Setpoint writes with retries, cancelled on stop so that no retry
+        # lands after the zero setpoints
+        self.flow_rate_futures = []
+
+    def start(self):
+        self.current_step = None
+        self.scheduler = SequenceScheduler(self.offsets, self.on_step, self.total_time, on_finish=self.on_finish)
+        self.scheduler.start()
+
+    def stop(self):
+        """Cancel the remaining steps and pending retries, then set every flow to zero."""
+        if self.scheduler is not None:
+            # Waits for a step being applied, so none is queued after the zeros below
+            self.scheduler.stop()
+            for line in self.scheduler.report_lines():
+                print(f"[Sequence Report] {line}")
+            self.scheduler = None
+        for future in self.flow_rate_futures:
+            future.cancel()
+        self.flow_rate_futures = []
+        for controller in self.controllers:
+            controller.set_flow_rate(0)
+
+    def elapsed(self):
+        """Seconds since start()."""
+        return 0.0 if self.scheduler is None else self.scheduler.elapsed()
+
+    def on_step(self, index):
+        """Apply the flow rates of a step; called on the scheduler thread at its deadline."""
+        self.current_step = index
+        flow_rates = self.rows[index][1:]
+        if index == 0:
+            print(f"[Initial Set] {describe_flows(flow_rates)}")
+            self.set_flow_rates(flow_rates, "Failed to set initial flowrates")
+        else:
+            print(f"[Sequence Switch] Time: {self.offsets[index]:.0f}s | {describe_flows(flow_rates)}")
+            self.set_flow_rates(flow_rates, "Failed to set flowrates")
+
+    def set_flow_rates(self, flow_rates, error_message):
+        """Queue all setpoints with retries; a final failure is passed to on_failure."""
+        self.flow_rate_futures = [future for future in self.flow_rate_futures if not future.done()]
+        for controller, flow_rate in zip(self.controllers, flow_rates):
+            self.flow_rate_futures.append(controller.set_flow_rate_with_retries(
+                flow_rate, callback=lambda future: self.on_flow_rate_result(future, error_message)))
+
+    def on_flow_rate_result(self, future, error_message):
+        # Called on an I/O, timer or the scheduler thread
+        if not future.cancelled() and future.exception() is not None and self.on_failure is not None:
+            self.on_failure(error_message, future.exception())
@@ -1,39 +1,128 @@
-import time
-import board
-import busio
-import adafruit_ads1x15.ads1115 as ADS
-from adafruit_ads1x15.analog_in import AnalogIn
-
-# Initialize I2C bus and ADS1115 ADC
-i2c = busio.I2C(board.SCL, board.SDA)
-ads = ADS.ADS1115(i2c)
-ads.gain = 2/3  # Gain setting to measure higher voltages
-
-# Create single-ended input on channel 0 (A0 pin)
-chan = AnalogIn(ads, ADS.P0)
-
-# Global variables for voltage range
-in_min = 0.821
-in_max = 2.763
-
-# Mapping function to map voltage to ppm
-def map_voltage_to_ppm(voltage, in_min=in_min, in_max=in_max, out_min=0, out_max=20000):
-    if voltage < in_min:
-        return 0
-    
-    return (voltage - in_min) * (out_max - out_min) / (in_max - in_min) + out_min
-
-# Function to monitor readings and return PPM value
-def hydrogen_sensor():
-    sensor_voltage = chan.voltage
-    ppm_value = map_voltage_to_ppm(sensor_voltage)
-    
-    hydrogen_percentage = ppm_value / 10000  # Calculated hydrogen percentage (optional)
-    # Return PPM value
-    return ppm_value
-
-# Function to monitor and return sensor voltage
-def hydrogen_sensor_voltage():
-    sensor_voltage = chan.voltage
-    
-    return sensor_voltage
+import time
+from threading import Thread
+import adc_backend
+from conversion import LinearCalibration
+from ring_buffer import TimestampedRingBuffer
+
+# ADC input of the hydrogen sensor (A0 pin); the bus is opened on first read
+HYDROGEN_CHANNEL = 0
+
+# Global variables for voltage range
+in_min = 0.821
+in_max = 2.763
+
+# Full scale of the sensor in ppm
+PPM_MAX = 20000
+
+# Voltage to ppm calibration; replaced by set_voltage_range()
+calibration = LinearCalibration(in_min, in_max, 0, PPM_MAX)
+
+# Mapping function to map voltage to ppm; accepts a scalar or a NumPy array
+def map_voltage_to_ppm(voltage):
+    return calibration(voltage)
+
+def set_voltage_range(new_min, new_max):
+    """Apply the clean-air and full-scale voltages of a calibration run."""
+    global in_min, in_max, calibration
+    calibration = LinearCalibration(new_min, new_max, 0, PPM_MAX)
+    in_min, in_max = new_min, new_max
+
+
+class ContinuousReader:
+    """Runs an ADC channel in continuous-conversion mode and buffers the voltages.
+
+    A background thread fetches each conversion result at the configured data
+    rate (samples per second, one of 8, 16, 32, 64, 128, 250, 475, 860) into a
+    timestamped ring buffer, so readers never wait for a conversion.
+    """
+
+    def __init__(self, channel, data_rate=128, capacity=8192):
+        self.channel = channel
+        self.data_rate = data_rate
+        self.buffer = TimestampedRingBuffer(capacity)
+        self.running = False
+        self._thread = None
+
+    def start(self):
+        if self.running:
+            return
+        adc_backend.get_backend().start_continuous(self.channel, self.data_rate)
+        self.running = True
+        self._thread = Thread(target=self._read_loop, name="ads1115-continuous", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        adc_backend.get_backend().stop_continuous()
+
+    def _read_loop(self):
+        period = 1.0 / self.data_rate
+        next_read = time.monotonic()
+        backend = adc_backend.get_backend()
+        while self.running:
+            try:
+                self.buffer.append(time.monotonic(), backend.read_voltage(self.channel))
+            except OSError as e:
+                print(f"Error reading hydrogen sensor: {e}")
+            next_read += period
+            delay = next_read - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_read = time.monotonic()  # Fell behind; do not burst
+
+    def latest(self):
+        """Return the newest voltage, or None before the first sample."""
+        sample = self.buffer.latest()
+        return None if sample is None else float(sample[1])
+
+    def average(self, seconds):
+        """Return the average voltage over the last given seconds."""
+        return self.buffer.mean(seconds)
+
+    def block(self, n, timeout=None):
+        """Wait for the next n samples and return them as (timestamps, voltages)."""
+        return self.buffer.wait_for(n, timeout)
+
+
+# Continuous reader for the hydrogen channel; idle until start_continuous()
+reader = ContinuousReader(HYDROGEN_CHANNEL)
+
+
+def start_continuous(data_rate=128):
+    """Switch the hydrogen sensor to continuous conversion at the given data rate."""
+    reader.data_rate = data_rate
+    reader.start()
+
+
+def stop_continuous():
+    reader.stop()
+
+
+# Function to monitor readings and return PPM value
+def hydrogen_sensor():
+    sensor_voltage = hydrogen_sensor_voltage()
+    ppm_value = map_voltage_to_ppm(sensor_voltage)
+    
+    hydrogen_percentage = ppm_value / 10000  # Calculated hydrogen percentage (optional)
+    # Return PPM value
+    return ppm_value
+
+# Function to monitor and return sensor voltage; uses the newest buffered
+# sample in continuous mode instead of starting a conversion
+def hydrogen_sensor_voltage():
+    if reader.running:
+        sensor_voltage = reader.latest()
+        if sensor_voltage is not None:
+            return sensor_voltage
+    sensor_voltage = adc_backend.get_backend().read_voltage(HYDROGEN_CHANNEL)
+    
+    return sensor_voltage
+
+# Function to return the average sensor voltage over the last seconds
+# (continuous mode only)
+def hydrogen_sensor_average_voltage(seconds):
+    return reader.average(seconds)
@@ -1,18 +1,124 @@
-class KalmanFilter:
-    def __init__(self, process_variance, measurement_variance, initial_estimate=0, initial_estimate_uncertainty=1):
-        self.process_variance = process_variance  # Q: Process noise variance
-        self.measurement_variance = measurement_variance  # R: Measurement noise variance
-        self.estimate = initial_estimate  # Initial estimate
-        self.estimate_uncertainty = initial_estimate_uncertainty  # P: Initial estimate uncertainty
-
-    def update(self, measurement):
-        # Kalman Gain
-        kalman_gain = self.estimate_uncertainty / (self.estimate_uncertainty + self.measurement_variance)
-
-        # Update estimate with measurement
-        self.estimate = self.estimate + kalman_gain * (measurement - self.estimate)
-
-        # Update estimate uncertainty
-        self.estimate_uncertainty = (1 - kalman_gain) * self.estimate_uncertainty + self.process_variance
-
-        return self.estimate
+import numpy as np
+
+
+class KalmanFilter:
+    def __init__(self, process_variance, measurement_variance, initial_estimate=0, initial_estimate_uncertainty=1):
+        self.process_variance = process_variance  # Q: Process noise variance
+        self.measurement_variance = measurement_variance  # R: Measurement noise variance
+        self.estimate = initial_estimate  # Initial estimate
+        self.estimate_uncertainty = initial_estimate_uncertainty  # P: Initial estimate uncertainty
+
+    def update(self, measurement):
+        # Kalman Gain
+        kalman_gain = self.estimate_uncertainty / (self.estimate_uncertainty + self.measurement_variance)
+
+        # Update estimate with measurement
+        self.estimate = self.estimate + kalman_gain * (measurement - self.estimate)
+
+        # Update estimate uncertainty
+        self.estimate_uncertainty = (1 - kalman_gain) * self.estimate_uncertainty + self.process_variance
+
+        return self.estimate
+
+
+# Largest dynamic range (as a power of ten) allowed inside one block of the
+# constant-gain batch filter; bounds the rounding error of the block formula
+_BLOCK_RANGE = 6 * np.log(10)
+
+
+class BatchKalmanFilter:
+    """KalmanFilter for many channels at once, on single samples or whole arrays.
+
+    Same random-walk model as KalmanFilter, with per-channel variances.
+    Once the gain of every channel is within a relative tolerance of its
+    steady-state value, the filter switches to that constant gain. Batch
+    filtering then becomes a first-order recursive filter, evaluated
+    block-wise in NumPy. NaN measurements leave the estimate of their
+    channel unchanged.
+    """
+
+    def __init__(self, process_variance, measurement_variance, initial_estimate=0, initial_estimate_uncertainty=1,
+                 channels=1, tolerance=1e-6):
+        shape = (channels,)
+        self.process_variance = np.broadcast_to(np.asarray(process_variance, dtype=float), shape).copy()
+        self.measurement_variance = np.broadcast_to(np.asarray(measurement_variance, dtype=float), shape).copy()
+        self.estimate = np.broadcast_to(np.asarray(initial_estimate, dtype=float), shape).copy()
+        self.estimate_uncertainty = np.broadcast_to(
+            np.asarray(initial_estimate_uncertainty, dtype=float), shape).copy()
+        self.tolerance = tolerance
+        self.kalman_gain = None
+        self.converged = False
+
+    def steady_state_gain(self):
+        """Return the gain the filter converges to, per channel."""
+        q = self.process_variance
+        r = self.measurement_variance
+        prior_uncertainty = (q + np.sqrt(q * q + 4 * q * r)) / 2
+        return prior_uncertainty / (prior_uncertainty + r)
+
+    def update(self, measurement):
+        """Filter one measurement per channel and return the estimates."""
+        measurement = np.asarray(measurement, dtype=float)
+        valid = ~np.isnan(measurement)
+        if self.converged:
+            gain = self.kalman_gain
+        else:
+            gain = self.estimate_uncertainty / (self.estimate_uncertainty + self.measurement_variance)
+            gain = np.where(valid, gain, 0.0)
+            self.estimate_uncertainty = (1 - gain) * self.estimate_uncertainty + self.process_variance
+            self.kalman_gain = gain
+            steady_gain = self.steady_state_gain()
+            if valid.all() and np.all(np.abs(gain - steady_gain) <= self.tolerance * steady_gain):
+                self.kalman_gain = steady_gain
+                self.converged = True
+
+        self.estimate = np.where(valid, self.estimate + gain * (measurement - self.estimate), self.estimate)
+        return self.estimate.copy()
+
+    def filter(self, measurements):
+        """Filter an array of shape (samples,) or (samples, channels) and return the estimates."""
+        measurements = np.asarray(measurements, dtype=float)
+        single_channel = measurements.ndim == 1
+        if single_channel:
+            measurements = measurements[:, None]
+        estimates = np.empty_like(measurements)
+
+        # Step sample by sample until the gain has settled
+        start = 0
+        while start < len(measurements) and not self.converged:
+            estimates[start] = self.update(measurements[start])
+            start += 1
+
+        remaining = measurements[start:]
+        if len(remaining):
+            if np.isnan(remaining).any():
+                for index, row in enumerate(remaining, start):
+                    estimates[index] = self.update(row)
+            else:
+                estimates[start:] = self._constant_gain_filter(remaining)
+                self.estimate = estimates[-1].copy()
+
+        return estimates[:, 0] if single_channel else estimates
+
+    def _constant_gain_filter(self, measurements):
+        # x[i] = a * x[i-1] + K * z[i] with a = 1 - K, written per block as
+        # x[i] = a^i * (a * x[-1] + K * cumsum(z[j] / a^j))
+        gain = self.kalman_gain
+        decay = 1 - gain
+        passthrough = decay <= 0  # Gain 1: estimate equals the measurement
+        decay = np.where(passthrough, 1.0, decay)
+        rate = (-np.log(decay)).max()
+        block = len(measurements) if rate <= 0 else max(1, min(len(measurements), int(_BLOCK_RANGE / rate)))
+        powers = decay ** np.arange(block)[:, None]
+
+        estimates = np.empty_like(measurements)
+        previous = self.estimate
+        for start in range(0, len(measurements), block):
+            chunk = measurements[start:start + block]
+            chunk_powers = powers[:len(chunk)]
+            estimates[start:start + len(chunk)] = chunk_powers * (
+                decay * previous + gain * np.cumsum(chunk / chunk_powers, axis=0))
+            previous = estimates[start + len(chunk) - 1]
+
+        estimates[:, passthrough] = measurements[:, passthrough]
+        return estimates
@@ -0,0 +1,151 @@
+# live_plot.py
+
+from collections import namedtuple
+from threading import Lock
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from ring_buffer import TimestampedRingBuffer
+
+# One plotted line: legend label, colour and y axis ("left" or "right")
+PlotSeries = namedtuple("PlotSeries", ["label", "color", "axis"])
+
+
+class LivePlot:
+    """Scrolling Tk plot of a fixed number of recent points per series.
+
+    Producers call add() from any thread; refresh() redraws on the Tk thread.
+    Points are kept in NumPy ring buffers and the y range is tracked
+    incrementally, so a frame costs the same after hours as after seconds.
+    Frames are blitted: only the lines are redrawn over a cached background,
+    and the axes are rendered again only when the x window pages forward or
+    a value leaves the y range. Label the axes through ax1 and ax2.
+
+    With a TelemetryHistory (fields in series order) every point is also
+    recorded there, and set_full_run(True) shows the whole run as a
+    decimated envelope of about view_points points instead.
+    """
+
+    def __init__(self, master, series, capacity=500, right_ylim=None, headroom=1.2, history=None,
+                 view_points=1000):
+        self.series = list(series)
+        self.capacity = capacity
+        self.right_ylim = right_ylim  # Fixed (min, max) of the right axis, None to autoscale
+        self.headroom = headroom
+        self.buffers = [TimestampedRingBuffer(capacity) for _ in self.series]
+        self.history = history
+        self.view_points = view_points
+        self.full_run = False
+        self._lock = Lock()
+        self._extremes = {"left": None, "right": None}  # Running (min, max) per axis
+        self._background = None
+        self._needs_full_draw = True
+
+        self.fig = Figure()
+        self.ax1 = self.fig.add_subplot()
+        self.ax2 = self.ax1.twinx() if any(s.axis == "right" for s in self.series) else None
+        self.ax1.set_xlim(0, capacity)
+        if self.ax2 is not None and right_ylim is not None:
+            self.ax2.set_ylim(*right_ylim)
+
+        self.lines = []
+        for s in self.series:
+            axis = self.ax2 if s.axis == "right" else self.ax1
+            line, = axis.plot([], [], label=s.label, color=s.color, animated=True)
+            self.lines.append(line)
+        self.ax1.legend(handles=[line for line, s in zip(self.lines, self.series) if s.axis != "right"],
+                        loc="upper left")
+        if self.ax2 is not None:
+            self.ax2.legend(handles=[line for line, s in zip(self.lines, self.series) if s.axis == "right"],
+                            loc="upper right")
+
+        self.canvas = FigureCanvasTkAgg(self.fig, master=master)
+        self.canvas.mpl_connect("draw_event", self._on_draw)
+
+    def get_tk_widget(self):
+        return self.canvas.get_tk_widget()
+
+    def add(self, x, values):
+        """Append one point per series (values in series order); thread-safe."""
+        with self._lock:
+            for s, buffer, value in zip(self.series, self.buffers, values):
+                buffer.append(x, value)
+                low, high = self._extremes[s.axis] or (value, value)
+                self._extremes[s.axis] = (min(low, value), max(high, value))
+        if self.history is not None:
+            self.history.append(x, values)
+
+    def clear(self):
+        with self._lock:
+            for buffer in self.buffers:
+                buffer.clear()
+            self._extremes = {"left": None, "right": None}
+        if self.history is not None:
+            self.history.clear()
+        self.ax1.set_xlim(0, self.capacity)
+        self._needs_full_draw = True
+
+    def set_full_run(self, full_run):
+        """Switch between the recent window and the whole recorded run."""
+        self.full_run = full_run and self.history is not None
+        if not self.full_run:
+            self.ax1.set_xlim(0, self.capacity)  # Pages back to the newest points on refresh
+        self._needs_full_draw = True
+
+    def _on_draw(self, event):
+        # A full draw renders everything but the animated lines; keep it as the blit background
+        self._background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_lines()
+
+    def _draw_lines(self):
+        for line in self.lines:
+            line.axes.draw_artist(line)
+
+    def _update_limits(self, newest_x):
+        changed = False
+        left, right = self.ax1.get_xlim()
+        if newest_x > right or newest_x < left:
+            # Page forward by a quarter window, keeping the last capacity points in view
+            right = newest_x + self.capacity / 4
+            self.ax1.set_xlim(max(0, right - self.capacity), right)
+            changed = True
+
+        for axis_name, axis in (("left", self.ax1), ("right", self.ax2)):
+            extremes = self._extremes[axis_name]
+            if axis is None or extremes is None or (axis_name == "right" and self.right_ylim is not None):
+                continue
+            low, high = axis.get_ylim()
+            if extremes[1] > high or min(extremes[0], 0) < low:
+                axis.set_ylim(min(extremes[0], 0), extremes[1] * self.headroom or 1)
+                changed = True
+        return changed
+
+    def refresh(self):
+        """Redraw with the newest points; call on the Tk thread."""
+        if self.full_run:
+            x, values = self.history.view(self.view_points)
+            data = [(x, values[field]) for field in self.history.fields]
+        else:
+            with self._lock:
+                data = [buffer.last(self.capacity) for buffer in self.buffers]
+        for line, (x, y) in zip(self.lines, data):
+            line.set_data(x, y)
+
+        newest = max((x[-1] for x, _ in data if len(x)), default=None)
+        if self.full_run:
+            # The x range grows with the run, so every frame is a full (bounded) draw
+            if newest is not None:
+                self.ax1.set_xlim(data[0][0][0], max(newest, data[0][0][0] + 1))
+            self._update_limits(newest if newest is not None else 0)
+            self._needs_full_draw = True
+        elif newest is not None and self._update_limits(newest):
+            self._needs_full_draw = True
+
+        if self._needs_full_draw or self._background is None:
+            self._needs_full_draw = False
+            self.canvas.draw()  # Caches the background and draws the lines via _on_draw
+            self.canvas.blit(self.fig.bbox)
+            return
+
+        self.canvas.restore_region(self._background)
+        self._draw_lines()
+        self.canvas.blit(self.fig.bbox)
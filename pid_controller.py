@@ -0,0 +1,96 @@
+# pid_controller.py
+
+import time
+import numpy as np
+
+# The automatic mode's gains were tuned for one update every LEGACY_STEP
+# seconds with the output divided by LEGACY_OUTPUT_DIVISOR
+LEGACY_STEP = 0.1
+LEGACY_OUTPUT_DIVISOR = 200
+
+
+class PidController:
+    """PID controller integrating over the real time between updates.
+
+    - ki is per second and kd in seconds, so the loop rate can change without
+      retuning.
+    - Anti-windup by conditional integration: the integral does not grow
+      while the output is saturated and the error pushes further into the
+      limit.
+    - The derivative acts on the measurement, not the error, so setpoint
+      steps cause no derivative kick; it is low-pass filtered with
+      derivative_time_constant seconds.
+    - setpoint_weight scales the setpoint in the proportional term (1 is
+      classic PID, lower values soften setpoint steps).
+    - The integral is kept as its contribution to the output, so changing
+      gains or setpoints mid-run does not bump the output.
+
+    Gains, setpoints and measurements may also be NumPy arrays to run many
+    independent loops at once (see tuning_workbench).
+    """
+
+    def __init__(self, kp, ki, kd, output_limits=(0, 100), derivative_time_constant=0.0, setpoint_weight=1.0):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.output_limits = output_limits
+        self.derivative_time_constant = derivative_time_constant
+        self.setpoint_weight = setpoint_weight
+        self.reset()
+
+    def reset(self, output=None):
+        """Forget all state; start the integral at output (bumpless takeover) or zero."""
+        self.integral_term = 0.0 if output is None else output
+        self.derivative_term = 0.0
+        self.last_measurement = None
+        self.last_time = None
+        self.output = output
+
+    def compute(self, setpoint, measurement, dt=None):
+        """Return the controller output for one update.
+
+        dt is the time since the previous update in seconds; by default it
+        is measured with time.monotonic(). The first update after reset()
+        has no time base and applies the proportional term only.
+        """
+        now = time.monotonic()
+        if dt is None:
+            dt = 0.0 if self.last_time is None else now - self.last_time
+        self.last_time = now
+        low, high = self.output_limits
+
+        error = setpoint - measurement
+        proportional = self.kp * (self.setpoint_weight * setpoint - measurement)
+
+        if self.last_measurement is not None and dt > 0:
+            raw_derivative = -self.kd * (measurement - self.last_measurement) / dt
+            smoothing = dt / (self.derivative_time_constant + dt)
+            self.derivative_term = self.derivative_term + smoothing * (raw_derivative - self.derivative_term)
+        self.last_measurement = measurement
+
+        integral_term = self.integral_term + self.ki * error * dt
+        output = proportional + integral_term + self.derivative_term
+
+        # Conditional integration: keep the old integral while saturated in the error's direction
+        winding_up = ((output > high) & (error > 0)) | ((output < low) & (error < 0))
+        self.integral_term = np.where(winding_up, self.integral_term, integral_term)
+        output = proportional + self.integral_term + self.derivative_term
+
+        self.output = np.clip(output, low, high)
+        if np.ndim(self.output) == 0:
+            self.integral_term = float(self.integral_term)
+            self.output = float(self.output)
+        return self.output
+
+
+def from_legacy_gains(kp, ki, kd, **options):
+    """Create a PidController from gains in the automatic mode's original units.
+
+    Those gains act on the error in ppm per LEGACY_STEP update with the
+    output divided by LEGACY_OUTPUT_DIVISOR; they are converted to the
+    per-second form so existing tunings keep their meaning at any loop rate.
+    """
+    return PidController(kp / LEGACY_OUTPUT_DIVISOR,
+                         ki / LEGACY_OUTPUT_DIVISOR / LEGACY_STEP,
+                         kd / LEGACY_OUTPUT_DIVISOR * LEGACY_STEP,
+                         **options)
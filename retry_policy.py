@@ -0,0 +1,181 @@
+# retry_policy.py
+
+import random
+import time
+from concurrent.futures import Future, InvalidStateError
+from threading import Lock, Timer
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised when a command is refused because its device is marked unhealthy."""
+
+
+class CircuitBreaker:
+    """Marks a device unhealthy after a number of consecutive failures.
+
+    While open, commands are refused immediately instead of waiting on a dead
+    link. After reset_timeout seconds one trial command is let through; its
+    outcome closes the breaker again or keeps it open.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.state = self.CLOSED
+        self._opened_at = 0.0
+        self._lock = Lock()
+
+    @property
+    def healthy(self):
+        return self.state == self.CLOSED
+
+    def allow_request(self):
+        """Return whether a command may be sent now."""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return self.state == self.CLOSED
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def reset(self):
+        self.record_success()
+
+
+class RetryPolicy:
+    """Exponential backoff with jitter and a timeout for each attempt."""
+
+    def __init__(self, attempts=3, base_delay=0.2, max_delay=5.0, multiplier=2.0, jitter=0.1,
+                 attempt_timeout=None):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter  # Fraction of the delay added or removed at random
+        self.attempt_timeout = attempt_timeout
+
+    def delay(self, attempt):
+        """Return the wait in seconds before retrying after the given (0-based) attempt."""
+        delay = min(self.max_delay, self.base_delay * self.multiplier ** attempt)
+        return max(0.0, delay * (1 + random.uniform(-self.jitter, self.jitter)))
+
+
+def call_with_retries(attempt, policy, breaker=None, description="command"):
+    """Run attempt() under a retry policy without blocking the calling thread.
+
+    attempt must start the operation and return a concurrent Future. Backoff
+    waits run on timer threads, so this is safe to call from the Tk main loop.
+    Returns a Future that resolves with the first successful result, or with
+    ConnectionError once all attempts failed or the circuit breaker is open.
+    Cancelling it withdraws the attempt still queued and stops the retries;
+    once cancel() returned, no further attempt is started.
+    """
+    result_future = Future()
+    cancel_lock = Lock()
+    current = [None]  # Future of the latest attempt
+
+    def on_result_done(future):
+        if future.cancelled():
+            with cancel_lock:
+                if current[0] is not None:
+                    current[0].cancel()
+
+    def settle(result=None, error=None):
+        # The caller may cancel the result at any time
+        try:
+            if error is None:
+                result_future.set_result(result)
+            else:
+                result_future.set_exception(error)
+        except InvalidStateError:
+            pass
+
+    def run(attempt_number):
+        if breaker is not None and not breaker.allow_request():
+            settle(error=CircuitOpenError(f"{description} refused, device is unhealthy."))
+            return
+
+        lock = Lock()
+        settled = [False]
+        timer = None
+
+        def finish(error, result=None):
+            with lock:
+                if settled[0]:
+                    return
+                settled[0] = True
+            if timer is not None:
+                timer.cancel()
+            if result_future.cancelled():
+                return
+
+            if error is None:
+                if breaker is not None:
+                    breaker.record_success()
+                settle(result)
+                return
+
+            if breaker is not None:
+                breaker.record_failure()
+            print(f"{description} failed on attempt {attempt_number + 1}: {error}")
+            if attempt_number + 1 < policy.attempts:
+                retry = Timer(policy.delay(attempt_number), run, (attempt_number + 1,))
+                retry.daemon = True
+                retry.start()
+            else:
+                settle(error=ConnectionError(f"{description} failed after {attempt_number + 1} attempts: {error}"))
+
+        # Checked and started under the lock, so a cancel() either comes
+        # first or sees the new attempt and withdraws it
+        with cancel_lock:
+            if result_future.cancelled():
+                return
+            try:
+                attempt_future = attempt()
+            except Exception as e:
+                attempt_future = None
+                attempt_error = e
+            current[0] = attempt_future
+        if attempt_future is None:
+            finish(attempt_error)
+            return
+
+        if policy.attempt_timeout:
+            def expire():
+                # A command still queued is withdrawn so it is not sent late
+                attempt_future.cancel()
+                finish(TimeoutError(f"no response within {policy.attempt_timeout} s"))
+
+            timer = Timer(policy.attempt_timeout, expire)
+            timer.daemon = True
+            timer.start()
+
+        def on_done(future):
+            if future.cancelled():
+                finish(TimeoutError("cancelled"))
+            elif future.exception() is not None:
+                finish(future.exception())
+            else:
+                finish(None, future.result())
+
+        attempt_future.add_done_callback(on_done)
+
+    result_future.add_done_callback(on_result_done)
+    run(0)
+    return result_future
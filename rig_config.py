@@ -0,0 +1,23 @@
+# rig_config.py
+#
+# Mass flow controllers of the test rig. Each entry is matched to a COM port
+# by its serial number in the start window; sequences carry one flow column
+# per entry, in this order. The first controller supplies hydrogen and the
+# second synthetic air for the closed-loop ppm mode.
+
+from collections import namedtuple
+
+MfcConfig = namedtuple("MfcConfig", ["name", "serial_number", "max_flow"])
+
+MFCS = [
+    MfcConfig("Hydrogen", "24170036", 500),
+    MfcConfig("Synthetic Air", "24170038", 500),
+]
+
+# Positions in MFCS used by the hydrogen/air mixing modes
+HYDROGEN_INDEX = 0
+AIR_INDEX = 1
+
+# Hydrogen concentration of the gas supplied to the hydrogen MFC in ppm (a 2 %
+# hydrogen blend, not pure hydrogen); the reading expected with only that gas flowing
+HYDROGEN_SOURCE_PPM = 20000
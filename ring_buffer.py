@@ -0,0 +1,105 @@
+# ring_buffer.py
+
+import time
+from threading import Condition
+import numpy as np
+
+
+class TimestampedRingBuffer:
+    """Fixed-size NumPy ring buffer of (timestamp, value) samples.
+
+    Appending never allocates; once full, the oldest samples are overwritten.
+    All methods are thread-safe and return copies in chronological order.
+    Timestamps are time.monotonic() seconds unless the producer says otherwise.
+    """
+
+    def __init__(self, capacity, dtype=float):
+        self.capacity = capacity
+        self._timestamps = np.zeros(capacity)
+        self._values = np.zeros(capacity, dtype=dtype)
+        self._head = 0  # Index of the next write
+        self._count = 0
+        self.total_appended = 0
+        self._cond = Condition()
+
+    def __len__(self):
+        return self._count
+
+    def append(self, timestamp, value):
+        with self._cond:
+            self._timestamps[self._head] = timestamp
+            self._values[self._head] = value
+            self._head = (self._head + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+            self.total_appended += 1
+            self._cond.notify_all()
+
+    def extend(self, timestamps, values):
+        """Append arrays of samples in one copy."""
+        timestamps = np.asarray(timestamps)[-self.capacity:]
+        values = np.asarray(values)[-self.capacity:]
+        count = len(values)
+        with self._cond:
+            first = min(count, self.capacity - self._head)
+            self._timestamps[self._head:self._head + first] = timestamps[:first]
+            self._values[self._head:self._head + first] = values[:first]
+            self._timestamps[:count - first] = timestamps[first:]
+            self._values[:count - first] = values[first:]
+            self._head = (self._head + count) % self.capacity
+            self._count = min(self._count + count, self.capacity)
+            self.total_appended += count
+            self._cond.notify_all()
+
+    def clear(self):
+        with self._cond:
+            self._head = 0
+            self._count = 0
+
+    def _last(self, n):
+        n = min(n, self._count)
+        indices = (self._head - n + np.arange(n)) % self.capacity
+        return self._timestamps[indices], self._values[indices]
+
+    def latest(self):
+        """Return the newest (timestamp, value), or None if empty."""
+        with self._cond:
+            if self._count == 0:
+                return None
+            index = (self._head - 1) % self.capacity
+            return self._timestamps[index], self._values[index]
+
+    def last(self, n):
+        """Return (timestamps, values) arrays of the newest n samples."""
+        with self._cond:
+            return self._last(n)
+
+    def window(self, seconds, now=None):
+        """Return (timestamps, values) of the samples from the last given seconds."""
+        now = time.monotonic() if now is None else now
+        with self._cond:
+            timestamps, values = self._last(self._count)
+        start = np.searchsorted(timestamps, now - seconds)
+        return timestamps[start:], values[start:]
+
+    def mean(self, seconds=None):
+        """Return the average over the last given seconds (all samples if None), or None if empty."""
+        if seconds is None:
+            _, values = self.last(self.capacity)
+        else:
+            _, values = self.window(seconds)
+        return float(values.mean()) if len(values) else None
+
+    def wait_for(self, n, timeout=None):
+        """Wait until n samples arrived after the call and return them as (timestamps, values).
+
+        Raises TimeoutError if they did not arrive in time; n is capped at the
+        capacity.
+        """
+        n = min(n, self.capacity)
+        with self._cond:
+            target = self.total_appended + n
+            if not self._cond.wait_for(lambda: self.total_appended >= target, timeout):
+                raise TimeoutError(f"Only {n - (target - self.total_appended)} of {n} samples arrived.")
+            arrived = self.total_appended - (target - n)
+            timestamps, values = self._last(arrived)
+            return timestamps[:n], values[:n]
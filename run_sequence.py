@@ -0,0 +1,180 @@
+# run_sequence.py
+#
+# Runs a sequence file on the rig without the GUI, for unattended runs on
+# machines without a display. Telemetry is written to a CSV file as it is
+# recorded. Imports neither Tk nor matplotlib.
+#
+#   python run_sequence.py sequence.txt --mode ppm --output run.csv
+#   python run_sequence.py flowtest.txt --mode flow --ports COM3 COM4
+#
+# Set SFC_EMULATOR=1 (and ADC_BACKEND=simulated) to run against emulated devices.
+
+import argparse
+import asyncio
+import csv
+import os
+import sys
+import threading
+import time
+import serial.tools.list_ports
+from async_devices import zero_all
+from controller import registry, PORT_FACTORIES
+from rig_config import MFCS
+from sampling_service import SamplingService
+from flow_sequence import FlowSequenceRunner
+from sequences import SETPOINT_SEQUENCE, FLOW_SEQUENCE, LEGACY, CSV, JSONL, read_sequence_file
+from automatic_control import AutomaticController, ControlStep, DEFAULT_SETTINGS, make_ppm_filter
+
+# Exit codes: sequence completed, failed, interrupted with Ctrl+C
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_INTERRUPTED = 130
+
+# Seconds each MFC gets to acknowledge the final zero setpoint and report it back
+ZERO_DEADLINE = 2.0
+
+
+def find_rig_ports():
+    """Open every available port and return the port of each MFC in MFCS, matched by serial number."""
+    serial_indices = {mfc.serial_number: index for index, mfc in enumerate(MFCS)}
+    ports = [None] * len(MFCS)
+    candidates = [port.device for port in serial.tools.list_ports.comports()] + list(PORT_FACTORIES)
+    for port in candidates:
+        controller = registry.get(port)
+        if controller.is_connected() and controller.serial_number in serial_indices:
+            ports[serial_indices[controller.serial_number]] = port
+        else:
+            registry.release(port)
+    missing = [mfc.name for mfc, port in zip(MFCS, ports) if port is None]
+    if missing:
+        raise ConnectionError(f"No port found for: {', '.join(missing)}")
+    return ports
+
+
+def confirm_zero_flows(controllers):
+    """Zero every MFC once more and print any that did not confirm a zero setpoint."""
+    results = asyncio.run(zero_all(controllers, ZERO_DEADLINE))
+    for controller, result in zip(controllers, results):
+        if isinstance(result, BaseException):
+            print(f"WARNING: could not confirm zero flow on port {controller.port}: {result!r}")
+        elif result != 0:
+            print(f"WARNING: port {controller.port} reports a setpoint of {result} sccm")
+
+
+def run_ppm_sequence(controllers, sequence, settings, writer):
+    """Closed-loop run of (minutes, ppm) pairs; returns True if it ran to the end."""
+    writer.writerow(ControlStep._fields)
+    sampler = SamplingService(controllers, ppm_filter=make_ppm_filter())
+    engine = AutomaticController(controllers, sampler, on_step=writer.writerow)
+    sampler.start()
+    try:
+        return engine.run(sequence, settings)
+    finally:
+        sampler.stop(wait=True)
+
+
+def run_flow_sequence(controllers, rows, writer):
+    """Open-loop run of (minutes, flow per MFC...) rows; returns True if it ran to the end."""
+    writer.writerow(["step", "timestamp", "ppm"] + [f"{mfc.name} flow" for mfc in MFCS])
+    finished = threading.Event()
+    failed = threading.Event()
+
+    def on_failure(error_message, error):
+        print(f"{error_message}: {error}")
+        failed.set()
+
+    runner = FlowSequenceRunner(controllers, rows, on_failure=on_failure, on_finish=finished.set)
+
+    def on_sample(sample):
+        step = 0 if runner.current_step is None else runner.current_step
+        writer.writerow([step, sample.timestamp, sample.ppm] + list(sample.flows))
+
+    sampler = SamplingService(controllers)
+    sampler.subscribe(on_sample)
+    sampler.start()
+    runner.start()
+    try:
+        # Short waits keep Ctrl+C responsive
+        while not finished.wait(0.5):
+            if failed.is_set():
+                return False
+        return True
+    finally:
+        # No step or retry may queue a setpoint after the zeros
+        runner.stop()
+        sampler.stop(wait=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a sequence file on the rig without the GUI.")
+    parser.add_argument("sequence", help="sequence file with the steps of the chosen mode")
+    parser.add_argument("--format", choices=(LEGACY, CSV, JSONL),
+                        help="sequence file format (default: from the extension, .csv, .jsonl or legacy)")
+    parser.add_argument("--mode", choices=("ppm", "flow"), required=True,
+                        help="ppm: closed-loop 'minutes, ppm' pairs (automatic mode); "
+                             "flow: open-loop 'minutes, flow per MFC' rows (semi-manual mode)")
+    parser.add_argument("--ports", nargs="+",
+                        help="port of each MFC in rig_config order (default: find them by serial number)")
+    parser.add_argument("--output", default=None,
+                        help="telemetry CSV file (default: <sequence>_<time>.csv)")
+    parser.add_argument("--kp", type=float, default=DEFAULT_SETTINGS.kp)
+    parser.add_argument("--ki", type=float, default=DEFAULT_SETTINGS.ki)
+    parser.add_argument("--kd", type=float, default=DEFAULT_SETTINGS.kd)
+    parser.add_argument("--flow-setpoint", type=float, default=DEFAULT_SETTINGS.flow_setpoint,
+                        help="total flow in sccm for ppm mode")
+    parser.add_argument("--no-filter", action="store_true", help="feed the raw ppm reading to the PID")
+    parser.add_argument("--no-feedforward", action="store_true", help="disable the mixing model feedforward")
+    args = parser.parse_args(argv)
+
+    try:
+        sequence = read_sequence_file(args.sequence, SETPOINT_SEQUENCE if args.mode == "ppm" else FLOW_SEQUENCE,
+                                      args.format)
+    except (OSError, ValueError) as e:
+        print(f"Invalid sequence {args.sequence}: {e}")
+        return EXIT_FAILED
+
+    # Offer emulated SFC5xxx controllers instead of hardware if requested
+    if os.environ.get("SFC_EMULATOR"):
+        import shdlc_emulator
+        shdlc_emulator.install()
+
+    output = args.output or f"{os.path.splitext(args.sequence)[0]}_{time.strftime('%Y%m%d_%H%M%S')}.csv"
+    controllers = []
+    try:
+        ports = args.ports or find_rig_ports()
+        if len(ports) != len(MFCS):
+            raise ValueError(f"Expected {len(MFCS)} ports, got {len(ports)}")
+        controllers = [registry.get(port) for port in ports]
+        for controller in controllers:
+            if not controller.is_connected():
+                raise ConnectionError(f"Could not open device on port {controller.port}")
+
+        total_minutes = sequence[:, 0].sum()
+        print(f"Running {len(sequence)} steps ({total_minutes:.1f} min) in {args.mode} mode, "
+              f"telemetry to {output}")
+        with open(output, "w", newline="", buffering=1) as file:  # Line buffered: flushed every row
+            writer = csv.writer(file)
+            if args.mode == "ppm":
+                settings = DEFAULT_SETTINGS._replace(kp=args.kp, ki=args.ki, kd=args.kd,
+                                                     flow_setpoint=args.flow_setpoint,
+                                                     use_filter=not args.no_filter,
+                                                     use_feedforward=not args.no_feedforward)
+                completed = run_ppm_sequence(controllers, sequence, settings, writer)
+            else:
+                completed = run_flow_sequence(controllers, sequence, writer)
+    except KeyboardInterrupt:
+        print("Interrupted, all flows set to zero")
+        return EXIT_INTERRUPTED
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return EXIT_FAILED
+    finally:
+        confirm_zero_flows([controller for controller in controllers if controller.is_connected()])
+        registry.close_all()
+
+    print("Sequence completed" if completed else "Sequence stopped")
+    return EXIT_OK if completed else EXIT_FAILED
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+# sampling_service.py
+
+import asyncio
+import time
+from collections import namedtuple
+from threading import Thread, Condition, Event, Lock
+import hydrogensensor
+from async_devices import AsyncFlowController, poll_all
+
+# One acquisition cycle: sequence number, time.monotonic() timestamp, hydrogen
+# concentration in ppm, the measured flow of every MFC (sccm, rig order) and
+# the hydrogen concentration after the optional ppm filter (same as ppm without)
+Sample = namedtuple("Sample", ["seq", "timestamp", "ppm", "flows", "filtered_ppm"])
+
+# Default acquisition rate in samples per second
+DEFAULT_SAMPLE_RATE = 10.0
+
+# Deadline in seconds for each read of a cycle; a device that misses it is
+# reported as missing for that cycle instead of holding up the others
+READ_DEADLINE = 0.5
+
+
+class SamplingService:
+    """Single owner of the sensor and MFC reads for one mode window.
+
+    A background thread reads the hydrogen sensor and all MFC flows at a
+    fixed rate and publishes each result as an immutable Sample. Consumers
+    either subscribe a callback (called on the sampling thread) or block in
+    wait_for_sample(), so no consumer ever touches the I2C bus or the serial
+    ports itself.
+
+    ppm_filter is an optional stage with an update(measurement) method, such
+    as kamlan_filter.BatchKalmanFilter, applied to every ppm reading.
+    """
+
+    def __init__(self, controllers, rate=DEFAULT_SAMPLE_RATE, read_ppm=None, ppm_filter=None):
+        self.controllers = list(controllers)
+        self.rate = rate
+        self.read_ppm = read_ppm or hydrogensensor.hydrogen_sensor
+        self.ppm_filter = ppm_filter
+        self.running = False
+        self._latest = None
+        self._seq = 0
+        self._subscribers = []
+        self._subscribers_lock = Lock()
+        self._cond = Condition()
+        self._thread = None
+        self._stop_event = Event()  # Of the current thread; each start() makes a new one
+
+    def subscribe(self, callback):
+        """Call callback(sample) for every new sample; returns the callback for unsubscribe()."""
+        with self._subscribers_lock:
+            self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._subscribers_lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def set_rate(self, rate):
+        """Change the acquisition rate (samples per second); applies from the next cycle."""
+        self.rate = rate
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        # A thread stopped without waiting may still be in its last cycle;
+        # the new thread waits for it, so the caller is never blocked and
+        # only one thread samples at a time
+        self._stop_event = Event()
+        self._thread = Thread(target=self._run, args=(self._stop_event, self._thread), name="sampling-service",
+                              daemon=True)
+        self._thread.start()
+
+    def stop(self, wait=False):
+        """Stop sampling.
+
+        Only pass wait=True off the Tk thread; subscribers that call into Tk
+        would otherwise deadlock against the join.
+        """
+        self.running = False
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify_all()
+        if wait and self._thread is not None:
+            self._thread.join()
+
+    def latest(self):
+        """Return the newest Sample, or None before the first cycle."""
+        return self._latest
+
+    def wait_for_sample(self, after_seq=None, timeout=None):
+        """Block until a sample newer than after_seq exists and return it (None on timeout or stop)."""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: not self.running or (self._latest is not None
+                                             and (after_seq is None or self._latest.seq > after_seq)),
+                timeout)
+            sample = self._latest
+        if sample is None or (after_seq is not None and sample.seq <= after_seq):
+            return None
+        return sample
+
+    async def _acquire(self, mfcs):
+        # All MFCs and the ADC are read at once, each within READ_DEADLINE
+        *flows, ppm = await poll_all(mfcs, READ_DEADLINE, self.read_ppm)
+        if isinstance(ppm, BaseException):
+            print(f"[Sampling] Error reading hydrogen sensor: {ppm!r}")
+            ppm = None
+        filtered_ppm = ppm
+        if ppm is not None and self.ppm_filter is not None:
+            filtered_ppm = float(self.ppm_filter.update(ppm)[0])
+        for index, (mfc, flow) in enumerate(zip(mfcs, flows)):
+            if isinstance(flow, BaseException):
+                print(f"[Sampling] Error reading flow on port {mfc.controller.port}: {flow!r}")
+                flows[index] = 0
+        self._seq += 1
+        return Sample(self._seq, time.monotonic(), ppm, tuple(flows), filtered_ppm)
+
+    def _run(self, stop_event, previous_thread):
+        if previous_thread is not None:
+            previous_thread.join()
+        loop = asyncio.new_event_loop()
+        try:
+            self._sample_until(stop_event, loop)
+        finally:
+            loop.close()
+
+    def _sample_until(self, stop_event, loop):
+        mfcs = [AsyncFlowController(controller, READ_DEADLINE) for controller in self.controllers]
+        next_cycle = time.monotonic()
+        while not stop_event.is_set():
+            sample = loop.run_until_complete(self._acquire(mfcs))
+            with self._cond:
+                self._latest = sample
+                self._cond.notify_all()
+            with self._subscribers_lock:
+                subscribers = list(self._subscribers)
+            for callback in subscribers:
+                try:
+                    callback(sample)
+                except Exception as e:
+                    print(f"[Sampling] Subscriber error: {e}")
+
+            next_cycle += 1.0 / self.rate
+            delay = next_cycle - time.monotonic()
+            if delay > 0:
+                with self._cond:
+                    self._cond.wait_for(stop_event.is_set, delay)
+            else:
+                next_cycle = time.monotonic()  # Overran; skip missed cycles
+
@@ -0,0 +1,90 @@
+# sequence_scheduler.py
+
+import time
+from collections import namedtuple
+from threading import Thread, Event, current_thread
+
+# How a step was executed: its index, planned and actual switch time in
+# seconds from the start of the run, and the lateness (actual - planned)
+StepReport = namedtuple("StepReport", ["index", "planned", "actual", "lateness"])
+
+
+def compile_schedule(durations):
+    """Turn step durations (seconds) into start offsets and the total run time."""
+    offsets = []
+    start = 0.0
+    for duration in durations:
+        offsets.append(start)
+        start += duration
+    return offsets, start
+
+
+class SequenceScheduler:
+    """Fires sequence steps at absolute deadlines on the monotonic clock.
+
+    Each step's deadline is the run's start time plus its planned offset, so
+    a late callback never shifts the steps after it. A dedicated thread
+    waits for the deadlines; steps whose deadline already passed (after a
+    stall) fire immediately, in order, so none is ever skipped. on_step and
+    on_finish run on the scheduler thread; the switch time of every step is
+    recorded in reports.
+    """
+
+    def __init__(self, offsets, on_step, total_duration, on_finish=None):
+        self.offsets = list(offsets)
+        self.on_step = on_step  # on_step(index)
+        self.total_duration = total_duration
+        self.on_finish = on_finish
+        self.reports = []
+        self.start_time = None
+        self._stop_event = Event()
+        self._thread = None
+
+    def start(self):
+        self.start_time = time.monotonic()
+        self._stop_event.clear()
+        self._thread = Thread(target=self._run, name="sequence-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Cancel the remaining steps; on_finish is not called.
+
+        Waits for a step being executed, so once stop() returns on_step is
+        not running and is not called again (unless stop() is called from
+        on_step itself). Callers must not block on the thread calling stop().
+        """
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not current_thread():
+            self._thread.join()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive() and not self._stop_event.is_set()
+
+    def elapsed(self):
+        """Seconds since start()."""
+        return 0.0 if self.start_time is None else time.monotonic() - self.start_time
+
+    def _wait_until(self, offset):
+        # Returns False if stopped before the deadline
+        delay = self.start_time + offset - time.monotonic()
+        return not self._stop_event.wait(delay) if delay > 0 else not self._stop_event.is_set()
+
+    def _run(self):
+        for index, offset in enumerate(self.offsets):
+            if not self._wait_until(offset):
+                return
+            actual = self.elapsed()
+            self.reports.append(StepReport(index, offset, actual, actual - offset))
+            try:
+                self.on_step(index)
+            except Exception as e:
+                print(f"[Scheduler] Step {index + 1} failed: {e}")
+
+        if self._wait_until(self.total_duration) and self.on_finish is not None:
+            self.on_finish()
+
+    def report_lines(self):
+        """Return a planned vs actual line for each executed step."""
+        return [f"Step {report.index + 1}: planned {report.planned:.3f} s, actual {report.actual:.3f} s, "
+                f"late {report.lateness * 1000:.1f} ms" for report in self.reports]
@@ -0,0 +1,300 @@
+# sequences.py
+#
+# Parsing and validation of the sequences run by the automatic mode (time and
+# ppm setpoint pairs) and the semi-manual mode (time and one flow per MFC).
+# Shared by the mode windows and the headless runner, so it imports no GUI.
+#
+# Three formats are read as a stream of lines, so files of any length parse
+# with one block of lines in memory besides the result:
+# - legacy: comma-separated values, any number per line; blank lines and a
+#   trailing comma at the end of a line are ignored ("0.25, 10, 90,")
+# - csv: one step per row, an optional header row, "#" comment lines
+# - jsonl: one step per line, as an array [minutes, value, ...] or an object
+#   {"time": minutes, "setpoint": ppm} / {"time": minutes, "flows": [...]};
+#   values must be JSON numbers
+#
+# Any other empty field is an error, so a typo never re-pairs the values.
+
+import csv
+import json
+import math
+import os
+from collections import namedtuple
+from itertools import islice
+import numpy as np
+from rig_config import MFCS
+
+# Highest hydrogen setpoint accepted in automatic mode sequences (ppm)
+MAX_SETPOINT_PPM = 20000
+
+# Lines parsed and validated at once. A block is converted in one NumPy call
+# and checked with array operations; only a block that fails is re-read
+# field by field, to locate the error or to accept unusual spacing.
+BLOCK_LINES = 4096
+
+# Sequence formats, and the format of each file extension (others are legacy)
+LEGACY, CSV, JSONL = "legacy", "csv", "jsonl"
+FORMAT_EXTENSIONS = {".csv": CSV, ".jsonl": JSONL, ".ndjson": JSONL}
+
+# File dialog filter for sequence files
+SEQUENCE_FILETYPES = [("Sequence files", "*.txt *.csv *.jsonl *.ndjson"), ("Text files", "*.txt"),
+                      ("CSV files", "*.csv"), ("JSON Lines files", "*.jsonl *.ndjson"), ("All files", "*.*")]
+
+# What a step of a sequence holds: values per step (the time in minutes
+# first), the JSON Lines object key of the values after the time, the upper
+# limit of each value and the message for a value outside 0..limit (times
+# must also be above 0)
+SequenceKind = namedtuple("SequenceKind", ["width", "value_key", "limits", "messages"])
+
+SETPOINT_SEQUENCE = SequenceKind(
+    2, "setpoint", (math.inf, MAX_SETPOINT_PPM),
+    ("Time values must be positive.", f"Setpoint values must be between 0 and {MAX_SETPOINT_PPM}."))
+
+FLOW_SEQUENCE = SequenceKind(
+    1 + len(MFCS), "flows", (math.inf,) + tuple(mfc.max_flow for mfc in MFCS),
+    ("Time values must be positive.",)
+    + tuple(f"{mfc.name} flowrate must be between 0 and {mfc.max_flow} sccm." for mfc in MFCS))
+
+
+class SequenceError(ValueError):
+    """Invalid sequence; row and column (1-based) locate the offending field in the input."""
+
+    def __init__(self, message, row=None, column=None, step=None):
+        self.row = row
+        self.column = column
+        self.step = step
+        if row is not None:
+            location = f"Row {row}" if column is None else f"Row {row}, column {column}"
+            if step is not None:
+                location += f" (step {step})"
+            message = f"{location}: {message}"
+        super().__init__(message)
+
+
+def format_for_path(path):
+    return FORMAT_EXTENSIONS.get(os.path.splitext(path)[1].lower(), LEGACY)
+
+
+def _is_number(field):
+    try:
+        float(field)
+        return True
+    except ValueError:
+        return False
+
+
+def _is_csv_header(line):
+    fields = next(csv.reader([line]), [])
+    return bool(fields) and not fields[0].lstrip().startswith("#") and not _is_number(fields[0])
+
+
+def _invalid_values(steps, kind):
+    """Mask of the values outside their limits."""
+    invalid = ~np.isfinite(steps) | (steps < 0) | (steps > np.asarray(kind.limits))
+    invalid[:, 0] |= steps[:, 0] == 0
+    return invalid
+
+
+def _without_trailing_comma(fields):
+    if len(fields) > 1 and not fields[-1].strip():
+        return fields[:-1]
+    return fields
+
+
+def _legacy_fields(block):
+    # (row, column, field) for every comma-separated field of the non-blank
+    # lines, except an empty one after a trailing comma
+    for row, line in block:
+        if not line.strip():
+            continue
+        for column, field in enumerate(_without_trailing_comma(line.split(',')), start=1):
+            yield row, column, field.strip()
+
+
+def _located_steps(block, fmt, kind, carry):
+    """Read a block field by field into steps of (row, column, field) lists.
+
+    Returns the steps and the fields of a legacy step continued on the
+    next block.
+    """
+    width = kind.width
+    steps = []
+    if fmt == LEGACY:
+        # A legacy step may span lines, so fields are grouped as they come
+        fields = carry + list(_legacy_fields(block))
+        complete = len(fields) - len(fields) % width
+        steps = [fields[i:i + width] for i in range(0, complete, width)]
+        return steps, fields[complete:]
+
+    if fmt == CSV:
+        for (row, _), fields in zip(block, csv.reader(line for _, line in block)):
+            fields = _without_trailing_comma(fields)
+            if not any(field.strip() for field in fields) or fields[0].lstrip().startswith("#"):
+                continue
+            if len(fields) != width:
+                raise SequenceError(f"Expected {width} values, got {len(fields)}.", row)
+            steps.append([(row, column, field.strip()) for column, field in enumerate(fields, start=1)])
+        return steps, []
+
+    for row, line in block:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if isinstance(record, dict):
+                value = record[kind.value_key]
+                record = [record["time"]] + (value if isinstance(value, list) else [value])
+        except json.JSONDecodeError as e:
+            raise SequenceError(f"Invalid JSON: {e.msg}.", row, e.colno)
+        except (KeyError, TypeError):
+            raise SequenceError(f"Expected an array or an object with \"time\" and \"{kind.value_key}\".", row)
+        if not isinstance(record, list) or len(record) != width:
+            raise SequenceError(f"Expected {width} values.", row)
+        steps.append([(row, column, value) for column, value in enumerate(record, start=1)])
+    return steps, []
+
+
+def _parse_value(row, column, field, step, fmt):
+    """Return the float in a field, or raise SequenceError."""
+    if fmt == JSONL and isinstance(field, (bool, str)):
+        # true, false and "100" are not taken as 1, 0 and 100
+        raise SequenceError(f"Not a number: {json.dumps(field)}.", row, column, step)
+    if field == "":
+        raise SequenceError("Empty value.", row, column, step)
+    try:
+        value = float(field)
+    except (TypeError, ValueError):
+        raise SequenceError(f"Not a number: {field!r}.", row, column, step)
+    if not math.isfinite(value):
+        raise SequenceError(f"Not a finite number: {field!r}.", row, column, step)
+    return value
+
+
+def _slow_block(block, fmt, kind, carry, first_step):
+    """Parse and validate a block field by field; raises SequenceError at the first bad field."""
+    located, carry = _located_steps(block, fmt, kind, carry)
+    steps = np.empty((len(located), kind.width))
+    for index, fields in enumerate(located):
+        for value_index, (row, column, field) in enumerate(fields):
+            steps[index, value_index] = _parse_value(row, column, field, first_step + index, fmt)
+    # The start of a step continued on the next block (or left incomplete),
+    # so a field such as "1 100" is reported as such rather than as missing values
+    for row, column, field in carry:
+        _parse_value(row, column, field, first_step + len(located), fmt)
+
+    invalid = _invalid_values(steps, kind)
+    if invalid.any():
+        index, value_index = np.argwhere(invalid)[0]
+        row, column, _ = located[index][value_index]
+        raise SequenceError(kind.messages[value_index], row, column, first_step + index)
+    return steps, carry
+
+
+def _fast_block(block, fmt, kind, carry):
+    """Parse and validate a block with NumPy; returns (steps, carry), or None if anything is off."""
+    width = kind.width
+    try:
+        if fmt == JSONL:
+            lines = [line for _, line in block if line.strip()]
+            # Each line wrapped on its own, so one that is not a single JSON value shows up
+            text = "[[" + "],[".join(lines) + "]]"
+            if "true" in text or "false" in text:
+                return None  # NumPy would take them as 1 and 0
+            records = json.loads(text)
+            if len(records) != len(lines) or any(len(record) != 1 for record in records):
+                return None
+            records = [record[0] for record in records]
+            key = kind.value_key
+            values = np.array([[record["time"]] + (record[key] if isinstance(record[key], list) else [record[key]])
+                               if isinstance(record, dict) else record for record in records])
+            if values.size and (values.ndim != 2 or values.shape[1] != width or values.dtype.kind not in "iuf"):
+                return None  # Ragged, or strings and other values that are not JSON numbers
+            values = values.astype(float)
+        else:
+            lines = [line.strip() for _, line in block]
+            lines = [line[:-1] if line.endswith(",") else line for line in lines if line]
+            if not all(lines):
+                return None  # A lone comma
+            if fmt == CSV:
+                lines = [line for line in lines if not line.startswith("#")]
+                if any(line.count(",") != width - 1 for line in lines):
+                    return None
+            text = ",".join(lines)
+            values = np.fromstring(text, sep=",") if text else np.empty(0)
+            if values.size != (text.count(",") + 1 if text else 0):
+                return None  # fromstring skips empty fields; let the slow path report them
+    except (ValueError, TypeError, KeyError):
+        return None
+
+    if carry:
+        values = np.concatenate([[float(field) for _, _, field in carry], values.ravel()])
+    leftover = values.size % width
+    if leftover:
+        # Locate the fields of the unfinished legacy step for the next block
+        carry = (carry + list(_legacy_fields(block)))[-leftover:]
+        values = values.ravel()[:values.size - leftover]
+    else:
+        carry = []
+    steps = values.reshape(-1, width)
+    if _invalid_values(steps, kind).any():
+        return None
+    return steps, carry
+
+
+def iter_step_blocks(lines, kind, fmt=LEGACY):
+    """Yield the validated steps of a sequence as (steps, kind.width) float64 arrays.
+
+    lines is any iterable of lines, such as an open file; it is consumed
+    BLOCK_LINES lines at a time. Raises SequenceError at the first invalid
+    field, with its row and column.
+    """
+    if fmt not in (LEGACY, CSV, JSONL):
+        raise ValueError(f"Unknown sequence format: {fmt}")
+
+    numbered = enumerate(lines, start=1)
+    block = list(islice(numbered, BLOCK_LINES))
+    if fmt == CSV and block and _is_csv_header(block[0][1]):
+        block = block[1:]
+    carry = []
+    first_step = 1
+    while True:
+        steps, carry = _fast_block(block, fmt, kind, carry) or _slow_block(block, fmt, kind, carry, first_step)
+        first_step += len(steps)
+        if len(steps):
+            yield steps
+        block = list(islice(numbered, BLOCK_LINES))
+        if not block:
+            break
+
+    if carry:
+        row, column, _ = carry[0]
+        raise SequenceError(f"Incomplete step: expected {kind.width} values, got {len(carry)}.",
+                            row, column, first_step)
+
+
+def load_steps(lines, kind, fmt=LEGACY):
+    """Parse a whole sequence into one (steps, kind.width) array; raises SequenceError."""
+    blocks = list(iter_step_blocks(lines, kind, fmt))
+    if not blocks:
+        raise SequenceError("Sequence is empty.")
+    return np.concatenate(blocks)
+
+
+def parse_setpoint_sequence(text):
+    """Parse "minutes, ppm, minutes, ppm, ..." into a (steps, 2) array."""
+    return load_steps(text.splitlines(), SETPOINT_SEQUENCE)
+
+
+def parse_flow_sequence(text):
+    """Parse "minutes, flow per MFC..., ..." into a (steps, 1 + MFCs) array, flows in sccm."""
+    return load_steps(text.splitlines(), FLOW_SEQUENCE)
+
+
+def read_sequence_file(path, kind, fmt=None):
+    """Stream a sequence file into a step array.
+
+    The format follows the file extension unless given. Raises
+    SequenceError for invalid content and OSError if the file cannot be read.
+    """
+    with open(path, newline="") as file:
+        return load_steps(file, kind, fmt or format_for_path(path))
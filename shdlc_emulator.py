@@ -0,0 +1,358 @@
+# shdlc_emulator.py
+#
+# Software SFC5xxx mass flow controller for testing without hardware. The
+# emulated device answers the SHDLC commands sent by sensirion_shdlc_sfc5xxx,
+# either through an in-process ShdlcPort stand-in or on a pseudo-terminal that
+# the real ShdlcSerialPort can open.
+#
+# Run "python shdlc_emulator.py" to benchmark transaction throughput and
+# end-to-end control loop latency against two emulated controllers.
+
+import math
+import os
+import random
+import struct
+import time
+from collections import deque
+from threading import RLock, Thread
+from sensirion_shdlc_driver import ShdlcConnection
+from sensirion_shdlc_driver.port import ShdlcPort
+from sensirion_shdlc_driver.errors import ShdlcTimeoutError
+import controller
+
+# SHDLC device error codes
+ERROR_DATA_SIZE = 0x01
+ERROR_UNKNOWN_COMMAND = 0x02
+ERROR_PARAMETER_OUT_OF_RANGE = 0x04
+
+# Largest number of buffered values returned in one frame
+MAX_BUFFER_VALUES_PER_FRAME = 60
+
+
+class EmulatedSfc5xxx:
+    """State and command handling of one emulated SFC5xxx.
+
+    The measured flow follows the setpoint with first-order dynamics
+    (time constant in seconds) and is sampled into a ring buffer every
+    sampling_time seconds, like the real device.
+
+    Error injection: set error_code to make every command fail with that
+    SHDLC device error, error_state to raise the error flag in responses,
+    or unresponsive to stop answering (the port times out).
+    """
+
+    def __init__(self, serial_number, fullscale=500.0, time_constant=0.2, latency=0.002, noise=0.0,
+                 sampling_time=0.01, buffer_size=256, gas_description="Air"):
+        self.serial_number = serial_number
+        self.fullscale = fullscale
+        self.time_constant = time_constant
+        self.latency = latency  # Processing time per command in seconds
+        self.noise = noise  # Standard deviation of the measured flow in sccm
+        self.sampling_time = sampling_time
+        self.gas_description = gas_description
+        self.medium_unit = (127, 255, 255)  # Undefined prefix, unit and time base
+
+        self.error_code = 0
+        self.error_state = False
+        self.unresponsive = False
+        self.commands_handled = 0
+
+        self.setpoint = 0.0
+        self.flow = 0.0
+        self._buffer = deque(maxlen=buffer_size)
+        self._lost_values = 0
+        self._last_update = time.monotonic()
+        self._next_sample = self._last_update + sampling_time
+        self._lock = RLock()
+
+    def _advance(self):
+        """Integrate the flow response and fill the sample buffer up to now."""
+        now = time.monotonic()
+        while self._next_sample <= now:
+            self._step_to(self._next_sample)
+            if len(self._buffer) == self._buffer.maxlen:
+                self._lost_values += 1
+            self._buffer.append(self._measure())
+            self._next_sample += self.sampling_time
+        self._step_to(now)
+
+    def _step_to(self, timestamp):
+        dt = timestamp - self._last_update
+        if dt > 0:
+            alpha = 1 - math.exp(-dt / self.time_constant) if self.time_constant > 0 else 1.0
+            self.flow += (self.setpoint - self.flow) * alpha
+            self._last_update = timestamp
+
+    def _measure(self):
+        if self.noise:
+            return max(0.0, self.flow + random.gauss(0, self.noise))
+        return self.flow
+
+    def _to_scaling(self, value, scaling):
+        return value / self.fullscale if scaling == 0 else value
+
+    def _from_scaling(self, value, scaling):
+        return value * self.fullscale if scaling == 0 else value
+
+    def handle(self, command_id, data):
+        """Execute one command and return (state byte, response payload)."""
+        with self._lock:
+            self.commands_handled += 1
+            self._advance()
+            if self.error_code:
+                return self._state(self.error_code), b""
+            try:
+                response = self._dispatch(command_id, bytes(data))
+            except (struct.error, IndexError):
+                return self._state(ERROR_DATA_SIZE), b""
+            if isinstance(response, int):
+                return self._state(response), b""
+            return self._state(0), response
+
+    def _state(self, error_code):
+        return (0x80 if self.error_state else 0) | error_code
+
+    def _dispatch(self, command_id, data):
+        if command_id == 0x00:  # Setpoint
+            scaling = data[0]
+            if len(data) == 1:
+                return struct.pack(">f", self._to_scaling(self.setpoint, scaling))
+            return self._set_setpoint(self._from_scaling(struct.unpack(">f", data[1:5])[0], scaling))
+        if command_id == 0x03:  # Set setpoint and read measured value
+            scaling = data[0]
+            error = self._set_setpoint(self._from_scaling(struct.unpack(">f", data[1:5])[0], scaling))
+            return error if error else struct.pack(">f", self._to_scaling(self._measure(), scaling))
+        if command_id == 0x08:  # Read measured value
+            return struct.pack(">f", self._to_scaling(self._measure(), data[0]))
+        if command_id == 0x09:  # Read measured value buffer
+            return self._read_buffer(data[0])
+        if command_id == 0x21:  # User defined medium unit
+            if len(data) == 1:
+                return struct.pack(">bBB", *self.medium_unit)
+            self.medium_unit = struct.unpack(">bBB", data[1:4])
+            return b""
+        if command_id == 0x44 and data[0] == 0x11:  # Current gas description
+            return self.gas_description.encode("utf-8") + b"\0"
+        if command_id == 0xD0 and data[0] == 0x03:  # Serial number
+            return self.serial_number.encode("utf-8") + b"\0"
+        if command_id == 0xD2:  # Device status
+            return struct.pack(">IB", 0, 0)
+        return ERROR_UNKNOWN_COMMAND
+
+    def _set_setpoint(self, setpoint):
+        if not 0 <= setpoint <= self.fullscale:
+            return ERROR_PARAMETER_OUT_OF_RANGE
+        self.setpoint = setpoint
+        return b""
+
+    def _read_buffer(self, scaling):
+        count = min(len(self._buffer), MAX_BUFFER_VALUES_PER_FRAME)
+        values = [self._to_scaling(self._buffer.popleft(), scaling) for _ in range(count)]
+        lost, self._lost_values = self._lost_values, 0
+        header = struct.pack(">IIf", lost, len(self._buffer), self.sampling_time)
+        return header + struct.pack(f">{count}f", *values)
+
+
+class EmulatedShdlcPort(ShdlcPort):
+    """In-process ShdlcPort that delivers frames straight to an emulated device.
+
+    The time a real 8N1 serial link needs to transfer each frame at the
+    configured bitrate is added to every transaction, so throughput numbers
+    are comparable to the hardware.
+    """
+
+    def __init__(self, device, bitrate=115200, simulate_transfer_time=True):
+        super(EmulatedShdlcPort, self).__init__()
+        self.device = device
+        self._bitrate = bitrate
+        self.simulate_transfer_time = simulate_transfer_time
+        self._lock = RLock()
+        self._open = True
+
+    @property
+    def description(self):
+        return f"emulator:{self.device.serial_number}@{self._bitrate}"
+
+    @property
+    def bitrate(self):
+        return self._bitrate
+
+    @bitrate.setter
+    def bitrate(self, bitrate):
+        self._bitrate = bitrate
+
+    @property
+    def lock(self):
+        return self._lock
+
+    @property
+    def is_open(self):
+        return self._open
+
+    def open(self):
+        self._open = True
+
+    def close(self):
+        self._open = False
+
+    def transceive(self, slave_address, command_id, data, response_timeout):
+        with self._lock:
+            if not self._open:
+                raise IOError(f"Port {self.description} is closed.")
+            if self.device.unresponsive:
+                time.sleep(response_timeout)
+                raise ShdlcTimeoutError()
+            state, response = self.device.handle(command_id, data)
+            delay = self.device.latency
+            if self.simulate_transfer_time:
+                # Unstuffed frame sizes: 5 + data bytes out, 6 + data bytes back
+                frame_bytes = 5 + len(data) + 6 + len(response) + 4
+                delay += frame_bytes * 10 / self._bitrate
+            if delay > 0:
+                time.sleep(delay)
+            return slave_address, command_id, state, response
+
+
+def _stuff(frame):
+    stuffed = bytearray()
+    for byte in frame:
+        if byte in (0x7E, 0x7D, 0x11, 0x13):
+            stuffed += bytes([0x7D, byte ^ 0x20])
+        else:
+            stuffed.append(byte)
+    return bytes(stuffed)
+
+
+def _unstuff(frame):
+    unstuffed = bytearray()
+    escape = False
+    for byte in frame:
+        if escape:
+            unstuffed.append(byte ^ 0x20)
+            escape = False
+        elif byte == 0x7D:
+            escape = True
+        else:
+            unstuffed.append(byte)
+    return bytes(unstuffed)
+
+
+def _checksum(frame):
+    return ~sum(frame) & 0xFF
+
+
+class PtyServer:
+    """Serves an emulated device on a pseudo-terminal (Linux/macOS only).
+
+    Open port_name with the normal ShdlcSerialPort to exercise the complete
+    serial stack, including framing and byte stuffing.
+    """
+
+    def __init__(self, device, slave_address=0):
+        import pty
+        import tty
+        self.device = device
+        self.slave_address = slave_address
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave)
+        self.port_name = os.ttyname(self._slave)
+        self._running = True
+        self._thread = Thread(target=self._serve, name=f"pty-{device.serial_number}", daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        pending = bytearray()
+        while self._running:
+            try:
+                chunk = os.read(self._master, 1024)
+            except OSError:
+                return
+            pending += chunk
+            while pending.count(0x7E) >= 2:
+                start = pending.index(0x7E)
+                end = pending.index(0x7E, start + 1)
+                raw, pending = bytes(pending[start + 1:end]), pending[end + 1:]
+                if not raw:
+                    pending = bytearray([0x7E]) + pending  # Stop byte followed by a new start
+                    continue
+                self._respond(_unstuff(raw))
+
+    def _respond(self, frame):
+        if len(frame) < 4 or _checksum(frame[:-1]) != frame[-1]:
+            return  # Corrupt frame, the master will time out
+        address, command_id, length = frame[0], frame[1], frame[2]
+        if address != self.slave_address or self.device.unresponsive:
+            return
+        state, response = self.device.handle(command_id, frame[3:3 + length])
+        if self.device.latency > 0:
+            time.sleep(self.device.latency)
+        body = bytes([address, command_id, state, len(response)]) + response
+        os.write(self._master, b"\x7e" + _stuff(body + bytes([_checksum(body)])) + b"\x7e")
+
+    def close(self):
+        self._running = False
+        os.close(self._slave)
+        os.close(self._master)
+
+
+def install(serial_numbers=("24170036", "24170038"), **device_options):
+    """Register emulated devices as ports named "emulator:<serial number>".
+
+    The ports show up in the start window and open through the controller
+    registry like real ones. Returns the emulated devices by port name.
+    """
+    devices = {}
+    for serial_number in serial_numbers:
+        device = EmulatedSfc5xxx(serial_number, **device_options)
+        port_name = f"emulator:{serial_number}"
+        controller.PORT_FACTORIES[port_name] = \
+            lambda baudrate, device=device: EmulatedShdlcPort(device, bitrate=baudrate)
+        devices[port_name] = device
+    return devices
+
+
+def benchmark(transactions=500, loop_iterations=200, latency=0.002):
+    """Print SHDLC throughput and control loop latency against two emulated MFCs."""
+    devices = install(latency=latency)
+    mfcs = [controller.registry.get(port) for port in devices]
+
+    start = time.perf_counter()
+    for _ in range(transactions):
+        mfcs[0].get_measured_flow()
+    elapsed = time.perf_counter() - start
+    print(f"Reads: {transactions / elapsed:.0f} transactions/s "
+          f"({elapsed / transactions * 1000:.2f} ms each)")
+
+    latencies = []
+    for i in range(loop_iterations):
+        start = time.perf_counter()
+        for mfc in mfcs:
+            mfc.get_measured_flow()
+        hydrogen = 50 + 10 * math.sin(i / 10)
+        mfcs[0].set_flow_rate(hydrogen)
+        mfcs[1].set_flow_rate(100 - hydrogen, wait=True)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    print(f"Control loop: median {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f} ms")
+    print("Commands handled: " + ", ".join(
+        f"{device.serial_number}={device.commands_handled}" for device in devices.values()))
+
+    if os.name == "posix":
+        from sensirion_shdlc_driver import ShdlcSerialPort
+        from sensirion_shdlc_sfc5xxx import Sfc5xxxShdlcDevice, Sfc5xxxScaling
+        server = PtyServer(EmulatedSfc5xxx("pty-0001", latency=latency))
+        with ShdlcSerialPort(port=server.port_name, baudrate=115200, additional_response_time=0.05) as port:
+            device = Sfc5xxxShdlcDevice(ShdlcConnection(port), slave_address=0)
+            start = time.perf_counter()
+            for _ in range(transactions // 5):
+                device.read_measured_value(Sfc5xxxScaling.USER_DEFINED)
+            elapsed = time.perf_counter() - start
+        server.close()
+        print(f"Pseudo-terminal reads: {transactions // 5 / elapsed:.0f} transactions/s")
+
+    controller.registry.close_all()
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,167 @@
+# telemetry_history.py
+
+from threading import Lock
+import numpy as np
+
+
+class TelemetryHistory:
+    """Whole-run history of several fields with a fixed memory footprint.
+
+    The newest recent_capacity samples are kept at full resolution. Samples
+    leaving that window are folded into overview buckets holding the first
+    and last x and the min and max of every field. When the overview is full,
+    neighbouring buckets are merged pairwise and the bucket width doubles, so
+    the run is always covered end to end and memory never grows past nbytes.
+    """
+
+    def __init__(self, fields, recent_capacity=6000, overview_capacity=2000):
+        self.fields = list(fields)
+        self.recent_capacity = recent_capacity
+        self.overview_capacity = overview_capacity
+        width = len(self.fields)
+
+        # Recent samples: ring of rows (x, field values...)
+        self._recent = np.zeros((recent_capacity, 1 + width))
+        self._head = 0
+        self._recent_count = 0
+
+        # Overview buckets: rows (first x, last x, mins..., maxes...)
+        self._overview = np.zeros((overview_capacity, 2 + 2 * width))
+        self._overview_sizes = np.zeros(overview_capacity, dtype=np.int64)  # Samples per bucket
+        self._overview_count = 0
+        self.bucket_width = 1  # Samples per overview bucket
+        self._open_bucket = None
+        self._open_count = 0
+
+        self.total = 0
+        self._lock = Lock()
+
+    def __len__(self):
+        return self.total
+
+    @property
+    def nbytes(self):
+        """Memory held by the sample arrays, fixed at construction."""
+        return self._recent.nbytes + self._overview.nbytes + self._overview_sizes.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._head = 0
+            self._recent_count = 0
+            self._overview_count = 0
+            self.bucket_width = 1
+            self._open_bucket = None
+            self._open_count = 0
+            self.total = 0
+
+    def append(self, x, values):
+        """Add one sample: x (time or step) and one value per field."""
+        with self._lock:
+            if self._recent_count == self.recent_capacity:
+                self._fold(self._recent[self._head])
+            else:
+                self._recent_count += 1
+            self._recent[self._head, 0] = x
+            self._recent[self._head, 1:] = values
+            self._head = (self._head + 1) % self.recent_capacity
+            self.total += 1
+
+    def _fold(self, row):
+        # Move one sample leaving the recent window into the open overview bucket
+        width = len(self.fields)
+        if self._open_bucket is None:
+            self._open_bucket = np.concatenate(([row[0], row[0]], row[1:], row[1:]))
+        else:
+            bucket = self._open_bucket
+            bucket[1] = row[0]
+            np.minimum(bucket[2:2 + width], row[1:], out=bucket[2:2 + width])
+            np.maximum(bucket[2 + width:], row[1:], out=bucket[2 + width:])
+        self._open_count += 1
+
+        if self._open_count >= self.bucket_width and self._overview_count == self.overview_capacity:
+            # Keep filling the open bucket up to the new width so all buckets stay equal
+            self._overview_count = self._merge_pairs(self._overview, self._overview_sizes, self._overview_count)
+            self.bucket_width *= 2
+        if self._open_count >= self.bucket_width:
+            self._overview[self._overview_count] = self._open_bucket
+            self._overview_sizes[self._overview_count] = self._open_count
+            self._overview_count += 1
+            self._open_bucket = None
+            self._open_count = 0
+
+    def _merge_pairs(self, buckets, sizes, count):
+        # Merge neighbouring buckets in place; returns the new count
+        width = len(self.fields)
+        pairs = count // 2
+        first = buckets[0:2 * pairs:2]
+        second = buckets[1:2 * pairs:2]
+        merged = np.empty((pairs, buckets.shape[1]))
+        merged[:, 0] = first[:, 0]
+        merged[:, 1] = second[:, 1]
+        merged[:, 2:2 + width] = np.minimum(first[:, 2:2 + width], second[:, 2:2 + width])
+        merged[:, 2 + width:] = np.maximum(first[:, 2 + width:], second[:, 2 + width:])
+        merged_sizes = sizes[0:2 * pairs:2] + sizes[1:2 * pairs:2]
+        if count % 2:
+            merged = np.vstack([merged, buckets[count - 1]])
+            merged_sizes = np.append(merged_sizes, sizes[count - 1])
+        buckets[:len(merged)] = merged
+        sizes[:len(merged)] = merged_sizes
+        return len(merged)
+
+    def _recent_rows(self, n):
+        n = min(n, self._recent_count)
+        indices = (self._head - n + np.arange(n)) % self.recent_capacity
+        return self._recent[indices]
+
+    def recent(self, n=None):
+        """Return (x, {field: values}) of the newest n full-resolution samples (all if None)."""
+        with self._lock:
+            rows = self._recent_rows(self.recent_capacity if n is None else n)
+        return rows[:, 0], {field: rows[:, 1 + index] for index, field in enumerate(self.fields)}
+
+    def view(self, max_points=1000):
+        """Return the whole run as a min/max envelope of at most max_points points.
+
+        Returns (x, {field: values}); each bucket contributes its minimum at
+        its first x and its maximum at its last x, which plots as the band
+        the signal covered. Overview buckets and recent samples are regrouped
+        by sample position, so the points are spread evenly over the run
+        however wide the stored buckets are.
+        """
+        width = len(self.fields)
+        with self._lock:
+            buckets = [self._overview[:self._overview_count].copy()]
+            sizes = [self._overview_sizes[:self._overview_count].copy()]
+            if self._open_bucket is not None:
+                buckets.append(self._open_bucket[None, :].copy())
+                sizes.append([self._open_count])
+            rows = self._recent_rows(self._recent_count)
+        recent = np.hstack([rows[:, :1], rows[:, :1], rows[:, 1:], rows[:, 1:]])
+        buckets = np.vstack(buckets + [recent])
+        sizes = np.concatenate(sizes + [np.ones(len(rows), dtype=np.int64)])
+
+        groups = max(1, max_points // 2)
+        if len(buckets) > groups:
+            # Group the buckets by the slice of the run their first sample is in
+            starts = np.cumsum(sizes) - sizes
+            group = starts * groups // max(1, starts[-1] + sizes[-1])
+            first = np.concatenate(([0], np.flatnonzero(np.diff(group)) + 1))
+            last = np.append(first[1:], len(buckets)) - 1
+            merged = np.empty((len(first), buckets.shape[1]))
+            merged[:, 0] = buckets[first, 0]
+            merged[:, 1] = buckets[last, 1]
+            merged[:, 2:2 + width] = np.minimum.reduceat(buckets[:, 2:2 + width], first)
+            merged[:, 2 + width:] = np.maximum.reduceat(buckets[:, 2 + width:], first)
+            buckets = merged
+        count = len(buckets)
+
+        x = np.empty(2 * count)
+        x[0::2] = buckets[:, 0]
+        x[1::2] = buckets[:, 1]
+        values = {}
+        for index, field in enumerate(self.fields):
+            envelope = np.empty(2 * count)
+            envelope[0::2] = buckets[:, 2 + index]
+            envelope[1::2] = buckets[:, 2 + width + index]
+            values[field] = envelope
+        return x, values
@@ -0,0 +1,71 @@
+# test_sequences.py
+#
+# Edge cases of the sequence parser. Run with: python -m unittest test_sequences
+
+import unittest
+from unittest import mock
+import sequences
+from sequences import (SETPOINT_SEQUENCE, FLOW_SEQUENCE, LEGACY, CSV, JSONL, SequenceError, load_steps,
+                       parse_setpoint_sequence)
+
+
+class SequenceParsingTest(unittest.TestCase):
+    def assertSteps(self, lines, expected, kind=SETPOINT_SEQUENCE, fmt=LEGACY):
+        self.assertEqual(load_steps(lines, kind, fmt).tolist(), expected)
+
+    def assertRejected(self, lines, message, row, column, kind=SETPOINT_SEQUENCE, fmt=LEGACY):
+        with self.assertRaises(SequenceError) as raised:
+            load_steps(lines, kind, fmt)
+        self.assertEqual((raised.exception.row, raised.exception.column), (row, column))
+        self.assertIn(message, str(raised.exception))
+
+    def test_legacy_tolerates_trailing_comma_and_blank_lines(self):
+        self.assertSteps(["5, 1000,", "", "  ", " 10, 2000 ,"], [[5, 1000], [10, 2000]])
+        self.assertSteps(["5,", "1000, 10,", "2000"], [[5, 1000], [10, 2000]])
+
+    def test_legacy_rejects_empty_fields(self):
+        self.assertRejected(["5,,10,200,3,"], "Empty value", 1, 2)
+        self.assertRejected(["1,100,,2,200"], "Empty value", 1, 3)
+        self.assertRejected([",1,100"], "Empty value", 1, 1)
+        self.assertRejected(["1,100,,"], "Empty value", 1, 3)
+        self.assertRejected(["1,100", " , "], "Empty value", 2, 1)
+
+    def test_legacy_names_unseparated_fields(self):
+        self.assertRejected(["1 100 2 200"], "Not a number: '1 100 2 200'", 1, 1)
+        self.assertRejected(["1;100;2;200"], "Not a number", 1, 1)
+
+    def test_incomplete_step(self):
+        self.assertRejected(["5, 1000, 10"], "Incomplete step", 1, 3)
+
+    def test_csv_rejects_empty_fields(self):
+        self.assertSteps(["time,ppm", "1,2,", ""], [[1, 2]], fmt=CSV)
+        self.assertRejected(["1,,2"], "Expected 2 values, got 3", 1, None, fmt=CSV)
+        self.assertRejected(["1,"], "Expected 2 values, got 1", 1, None, fmt=CSV)
+        self.assertRejected(["1, 2", " ,3"], "Empty value", 2, 1, fmt=CSV)
+
+    def test_jsonl_accepts_numbers_only(self):
+        self.assertSteps(['[1, 5.5]', '{"time": 2, "setpoint": 7}'], [[1, 5.5], [2, 7]], fmt=JSONL)
+        self.assertSteps(['{"time": 1, "flows": [10, 20]}'], [[1, 10, 20]], kind=FLOW_SEQUENCE, fmt=JSONL)
+        self.assertRejected(['[1, "100"]'], 'Not a number: "100"', 1, 2, fmt=JSONL)
+        self.assertRejected(['{"time": "1", "setpoint": 5}'], 'Not a number: "1"', 1, 1, fmt=JSONL)
+        self.assertRejected(['[1, 5]', '[2, true]'], "Not a number: true", 2, 2, fmt=JSONL)
+        self.assertRejected(['{"time": 1, "setpoint": false}'], "Not a number: false", 1, 2, fmt=JSONL)
+        self.assertRejected(['[1, null]'], "Not a number", 1, 2, fmt=JSONL)
+
+    def test_block_boundaries(self):
+        # A legacy step may continue on the next block; errors keep their location
+        with mock.patch.object(sequences, "BLOCK_LINES", 2):
+            self.assertSteps(["1, 100", "2", "200, 3", "300"], [[1, 100], [2, 200], [3, 300]])
+            self.assertRejected(["1, 100", "2 x", "3, 4"], "Not a number: '2 x'", 2, 1)
+            self.assertRejected(["1, 100", "2,", ",3", "4"], "Empty value", 3, 1)
+
+    def test_fast_and_slow_paths_agree(self):
+        lines = [f"{1 + index % 5}, {index * 10}," for index in range(1000)]
+        expected = parse_setpoint_sequence("\n".join(lines)).tolist()
+        with mock.patch.object(sequences, "_fast_block", lambda *args: None):
+            self.assertEqual(parse_setpoint_sequence("\n".join(lines)).tolist(), expected)
+            self.assertRejected(["5,,10,200,3,"], "Empty value", 1, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,276 @@
+# tuning_workbench.py
+#
+# Offline tuning of the automatic mode's PID gains and the Kalman filter
+# variances. A recorded run (or a default plant) is turned into a first-order
+# plus dead-time model of the rig; every parameter set of a grid is then
+# simulated in closed loop, all sets of a batch at once as NumPy arrays, and
+# ranked by overshoot, settling time and integrated absolute error (IAE).
+#
+# Recorded runs are the telemetry CSV files of run_sequence.py --mode ppm:
+# a header row with the ControlStep fields, of which these columns are used
+#   timestamp     sample time in seconds
+#   setpoint      hydrogen setpoint in ppm
+#   ppm           raw hydrogen reading in ppm
+#   hydrogen_flow commanded hydrogen MFC flow in sccm
+#   total_flow    measured total flow in sccm
+# Other columns are ignored.
+#
+# Example:
+#   python tuning_workbench.py --recording run.csv --kp 0.1:1:10 --ki 0.01:0.1:10 --kd 0:0.5:6
+#       --q 10,100,1000 --r 2500 --sequence 2,5000,2,10000 --workers 4
+
+import argparse
+import csv
+import itertools
+import os
+import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from pid_controller import from_legacy_gains
+from feedforward import MixingModel, ReferenceTrajectory
+from rig_config import HYDROGEN_SOURCE_PPM
+from automatic_control import ControlStep
+
+# A recorded run, one array per CSV column; the names are ControlStep fields
+# so the recorder and the workbench share one schema
+Recording = namedtuple("Recording", ["timestamp", "setpoint", "ppm", "hydrogen_flow", "total_flow"])
+assert set(Recording._fields) <= set(ControlStep._fields)
+
+# Sensor response to the hydrogen fraction of the gas: ppm approaches
+# gain * fraction with time_constant (s) after dead_time (s); noise is the
+# standard deviation of the sensor reading in ppm
+PlantModel = namedtuple("PlantModel", ["gain", "time_constant", "dead_time", "noise"])
+
+# Used when no recording is given
+DEFAULT_PLANT = PlantModel(HYDROGEN_SOURCE_PPM, 20.0, 3.0, 50.0)
+
+# One parameter set and its scores
+TuningResult = namedtuple("TuningResult", ["kp", "ki", "kd", "q", "r", "overshoot", "settling_time", "iae"])
+
+
+def load_recording(path):
+    """Load a recorded run from a CSV file with the columns described above."""
+    columns = {field: [] for field in Recording._fields}
+    with open(path, newline="") as file:
+        reader = csv.DictReader(file)
+        missing = [field for field in Recording._fields if field not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"{path} is missing the column(s) {', '.join(missing)}; "
+                             f"record the run with run_sequence.py --mode ppm.")
+        for line, row in enumerate(reader, start=2):
+            try:
+                for field in Recording._fields:
+                    columns[field].append(float(row[field]))
+            except (TypeError, ValueError):
+                raise ValueError(f"{path}, line {line}: {field} is not a number: {row[field]!r}.") from None
+    if len(columns["timestamp"]) < 10:
+        raise ValueError(f"{path} holds too few samples to fit a plant model.")
+    return Recording(**{field: np.asarray(values) for field, values in columns.items()})
+
+
+def _simulate_plant(fraction, dt, gains, time_constants, dead_steps):
+    # Open-loop response of one candidate model per column
+    count = len(fraction)
+    ppm = np.zeros((count, len(time_constants)))
+    alpha = np.minimum(1.0, dt / time_constants)
+    for index in range(1, count):
+        delayed = np.where(index - 1 - dead_steps >= 0, fraction[np.maximum(index - 1 - dead_steps, 0)], 0.0)
+        ppm[index] = ppm[index - 1] + alpha * (gains * delayed - ppm[index - 1])
+    return ppm
+
+
+def fit_plant(recording, time_constants=np.linspace(1, 120, 60), dead_times=np.linspace(0, 20, 21)):
+    """Fit a PlantModel to a recording by grid search over time constant and dead time."""
+    dt = float(np.median(np.diff(recording.timestamp)))
+    fraction = np.where(recording.total_flow > 0, recording.hydrogen_flow / np.maximum(recording.total_flow, 1e-9), 0)
+    taus, deads = (grid.ravel() for grid in np.meshgrid(time_constants, dead_times))
+    dead_steps = np.round(deads / dt).astype(int)
+
+    # Simulate with unit gain, then fit each candidate's gain by least squares
+    unit = _simulate_plant(fraction, dt, np.ones(len(taus)), taus, dead_steps)
+    gains = (unit * recording.ppm[:, None]).sum(axis=0) / np.maximum((unit * unit).sum(axis=0), 1e-12)
+    errors = ((unit * gains - recording.ppm[:, None]) ** 2).mean(axis=0)
+    best = int(np.argmin(errors))
+
+    noise = float(np.std(np.diff(recording.ppm)) / np.sqrt(2))
+    return PlantModel(float(gains[best]), float(taus[best]), float(deads[best]), noise)
+
+
+def setpoint_profile(sequence, dt):
+    """Turn (minutes, setpoint) pairs into a setpoint per control step."""
+    return np.concatenate([np.full(max(1, int(round(minutes * 60 / dt))), setpoint)
+                           for minutes, setpoint in sequence])
+
+
+def simulate(plant, setpoints, dt, flow_setpoint, kp, ki, kd, q, r, seed=0, derivative_filter=0.5,
+             mixing_model=None):
+    """Simulate the automatic mode loop for arrays of parameter sets.
+
+    kp, ki, kd, q and r are equally long arrays, one entry per parameter set.
+    The gains are in the automatic mode's units and run through the same
+    PidController; q and r are the Kalman process and measurement variances
+    (r <= 0 disables the filter). With a feedforward.MixingModel the PID
+    only corrects the residual of the model's flow split around the
+    expected response (time constant of the plant), as in automatic mode.
+
+    Returns the measured ppm, shape (steps, parameter sets).
+    """
+    count = len(kp)
+    steps = len(setpoints)
+    rng = np.random.default_rng(seed)
+    noise = rng.normal(0, plant.noise, steps)  # Same noise for every set
+    dead_steps = int(round(plant.dead_time / dt))
+    alpha = min(1.0, dt / plant.time_constant)
+
+    ppm = np.zeros(count)
+    estimate = np.zeros(count)
+    uncertainty = np.ones(count)
+    pid = from_legacy_gains(kp, ki, kd, output_limits=(0, 100), derivative_time_constant=derivative_filter)
+    reference = ReferenceTrajectory(plant.time_constant)
+    reference.reset(0.0)
+    fractions = np.zeros((dead_steps + 1, count))  # Gas still on its way to the sensor
+    filtered = r > 0
+    measured_log = np.empty((steps, count))
+
+    for step in range(steps):
+        measured = ppm + noise[step]
+        measured_log[step] = measured
+
+        # Kalman stage (random-walk model, as kamlan_filter.KalmanFilter)
+        gain = uncertainty / (uncertainty + np.where(filtered, r, 1.0))
+        estimate = estimate + gain * (measured - estimate)
+        uncertainty = (1 - gain) * uncertainty + q
+        controlled = np.where(filtered, estimate, measured)
+
+        if mixing_model is None:
+            feedforward = 0.0
+            pid_setpoint = setpoints[step]
+        else:
+            feedforward = mixing_model.control_signal(setpoints[step])
+            pid_setpoint = reference.update(setpoints[step], dt)
+        pid.output_limits = (-feedforward, 100 - feedforward)
+        control_signal = feedforward + pid.compute(pid_setpoint, controlled, dt)
+
+        hydrogen_flow = (flow_setpoint / 100) * control_signal
+        fractions = np.roll(fractions, 1, axis=0)
+        fractions[0] = hydrogen_flow / flow_setpoint
+        ppm = ppm + alpha * (plant.gain * fractions[-1] - ppm)
+
+    return measured_log
+
+
+def score(measured, setpoints, dt, band=0.05):
+    """Return (overshoot %, settling time s, IAE ppm*s) per parameter set.
+
+    Overshoot and settling time are the worst over all setpoint steps;
+    settling means staying within band (fraction of the setpoint) until the
+    step ends. A set that never settles gets the step length.
+    """
+    count = measured.shape[1]
+    overshoot = np.zeros(count)
+    settling = np.zeros(count)
+    iae = np.abs(measured - setpoints[:, None]).sum(axis=0) * dt
+
+    edges = np.flatnonzero(np.diff(setpoints)) + 1
+    for start, end in zip(np.concatenate([[0], edges]), np.concatenate([edges, [len(setpoints)]])):
+        target = setpoints[start]
+        previous = setpoints[start - 1] if start > 0 else 0.0
+        segment = measured[start:end]
+        step = target - previous
+        if step != 0:
+            beyond = (segment - target) * np.sign(step)
+            overshoot = np.maximum(overshoot, 100 * np.maximum(beyond.max(axis=0), 0) / abs(step))
+
+        outside = np.abs(segment - target) > band * max(abs(target), 1.0)
+        # Index after the last sample outside the band
+        last_outside = np.where(outside.any(axis=0),
+                                len(segment) - np.argmax(outside[::-1], axis=0), 0)
+        settling = np.maximum(settling, last_outside * dt)
+
+    return overshoot, settling, iae
+
+
+def parse_values(text):
+    """Parse 'a,b,c' as a list or 'start:stop:count' as an even spacing."""
+    if ":" in text:
+        start, stop, count = text.split(":")
+        return list(np.linspace(float(start), float(stop), int(count)))
+    return [float(value) for value in text.split(",")]
+
+
+def _evaluate_batch(plant, setpoints, dt, flow_setpoint, mixing_model, batch):
+    kp, ki, kd, q, r = (np.asarray(column, dtype=float) for column in zip(*batch))
+    measured = simulate(plant, setpoints, dt, flow_setpoint, kp, ki, kd, q, r, mixing_model=mixing_model)
+    overshoot, settling, iae = score(measured, setpoints, dt)
+    return [TuningResult(*params, float(o), float(s), float(e))
+            for params, o, s, e in zip(batch, overshoot, settling, iae)]
+
+
+def tune(plant, sequence, grid, dt=0.1, flow_setpoint=100, batch_size=2048, workers=1, mixing_model=None):
+    """Evaluate every (kp, ki, kd, q, r) of grid and return the results, best first.
+
+    Parameter sets run in vectorised batches; with workers > 1 the batches
+    are spread over a process pool. Results are ranked by IAE, then
+    overshoot, then settling time.
+    """
+    setpoints = setpoint_profile(sequence, dt)
+    grid = list(grid)
+    batches = [grid[start:start + batch_size] for start in range(0, len(grid), batch_size)]
+    arguments = (itertools.repeat(plant), itertools.repeat(setpoints), itertools.repeat(dt),
+                 itertools.repeat(flow_setpoint), itertools.repeat(mixing_model), batches)
+
+    if workers > 1 and len(batches) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = [result for batch in pool.map(_evaluate_batch, *arguments) for result in batch]
+    else:
+        results = [result for batch in map(_evaluate_batch, *arguments) for result in batch]
+
+    results.sort(key=lambda result: (result.iae, result.overshoot, result.settling_time))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank PID gains and Kalman variances against a plant model.")
+    parser.add_argument("--recording", help="CSV of a recorded automatic mode run to fit the plant model")
+    parser.add_argument("--kp", default="0.395", help="Kp values, 'a,b,c' or 'start:stop:count'")
+    parser.add_argument("--ki", default="0.035")
+    parser.add_argument("--kd", default="0.1")
+    parser.add_argument("--q", default="100", help="Kalman process variances (ppm^2)")
+    parser.add_argument("--r", default="2500", help="Kalman measurement variances (ppm^2), 0 disables the filter")
+    parser.add_argument("--sequence", default="5,5000,5,10000,5,2000",
+                        help="Comma separated minutes,setpoint pairs as in automatic mode")
+    parser.add_argument("--flow-setpoint", type=float, default=100.0)
+    parser.add_argument("--dt", type=float, default=0.1, help="Control period in seconds")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--feedforward", action="store_true",
+                        help="Simulate with the saved mixing model as feedforward")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    plant = DEFAULT_PLANT
+    if args.recording:
+        try:
+            plant = fit_plant(load_recording(args.recording))
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            return 1
+    print(f"Plant: gain {plant.gain:.0f} ppm, time constant {plant.time_constant:.1f} s, "
+          f"dead time {plant.dead_time:.1f} s, noise {plant.noise:.1f} ppm")
+
+    values = [float(value) for value in args.sequence.split(",")]
+    sequence = list(zip(values[0::2], values[1::2]))
+    grid = itertools.product(*(parse_values(text) for text in (args.kp, args.ki, args.kd, args.q, args.r)))
+    mixing_model = MixingModel.load() if args.feedforward else None
+    results = tune(plant, sequence, grid, args.dt, args.flow_setpoint, workers=args.workers,
+                   mixing_model=mixing_model)
+
+    print(f"{len(results)} parameter sets evaluated")
+    print(f"{'Kp':>8} {'Ki':>8} {'Kd':>8} {'Q':>8} {'R':>8} {'Overshoot %':>12} {'Settling s':>11} {'IAE':>12}")
+    for result in results[:args.top]:
+        print(f"{result.kp:8.4g} {result.ki:8.4g} {result.kd:8.4g} {result.q:8.4g} {result.r:8.4g} "
+              f"{result.overshoot:12.1f} {result.settling_time:11.1f} {result.iae:12.4g}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+# virtual_table.py
+
+import tkinter as tk
+from tkinter import ttk
+
+# Background of the row of the step being executed
+CURRENT_ROW_COLOR = "#c8e6c9"
+
+
+class VirtualTable:
+    """Treeview showing a window of rows from a step array.
+
+    The Treeview only ever holds height items. Scrolling, loading new rows
+    and moving the highlight rewrite the values of those items instead of
+    inserting and deleting one item per step, so a sequence of any length
+    is shown in constant time. The first column is the 1-based row number;
+    the others show the columns of the rows, formatted with fmt.
+
+    set_current() highlights the executing step and keeps it in view. All
+    methods must be called on the Tk thread.
+    """
+
+    def __init__(self, master, columns, widths, height=10, fmt="{:g}"):
+        self.columns = tuple(columns)
+        self.height = height
+        self.fmt = fmt
+        self.rows = []
+        self.first = 0  # Index of the row shown in the top item
+        self.current = None
+
+        self.frame = tk.Frame(master)
+        self.tree = ttk.Treeview(self.frame, columns=self.columns, show="headings", height=height,
+                                 selectmode="none")
+        for column, width in zip(self.columns, widths):
+            self.tree.heading(column, text=column)
+            self.tree.column(column, width=width, anchor="center")
+        self.tree.tag_configure("current", background=CURRENT_ROW_COLOR)
+        self.items = [self.tree.insert("", "end") for _ in range(height)]
+
+        self.y_scrollbar = ttk.Scrollbar(self.frame, orient="vertical", command=self.on_scrollbar)
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        self.y_scrollbar.grid(row=0, column=1, sticky="ns")
+        self.frame.grid_rowconfigure(0, weight=1)
+        self.frame.grid_columnconfigure(0, weight=1)
+
+        for widget in (self.tree, self.y_scrollbar):
+            widget.bind("<MouseWheel>", self.on_mouse_wheel)
+            widget.bind("<Button-4>", lambda event: self.scroll(-1))  # X11 wheel up
+            widget.bind("<Button-5>", lambda event: self.scroll(1))  # X11 wheel down
+        self.render()
+
+    def get_tk_widget(self):
+        return self.frame
+
+    def set_rows(self, rows):
+        """Show new rows (a 2-D array or a list of sequences) from the top."""
+        self.rows = rows
+        self.first = 0
+        self.current = None
+        self.render()
+
+    def clear(self):
+        self.set_rows([])
+
+    def set_current(self, index):
+        """Highlight row index (None for none) and scroll it into view."""
+        if index == self.current:
+            return
+        self.current = index
+        if index is not None and not self.first <= index < self.first + self.height:
+            # Keep a row of context above the executing step
+            self.first = self._clamp(index - 1)
+        self.render()
+
+    def scroll(self, rows):
+        self.scroll_to(self.first + rows)
+
+    def scroll_to(self, first):
+        first = self._clamp(first)
+        if first != self.first:
+            self.first = first
+            self.render()
+
+    def on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(round(float(amount) * len(self.rows)))
+        elif unit == "pages":
+            self.scroll(int(amount) * (self.height - 1))
+        else:
+            self.scroll(int(amount))
+
+    def on_mouse_wheel(self, event):
+        # Windows reports multiples of 120 per notch, macOS small deltas
+        notches = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        self.scroll(-notches * 3)
+
+    def _clamp(self, first):
+        return max(0, min(first, len(self.rows) - self.height))
+
+    def render(self):
+        """Write the visible window of rows into the items."""
+        count = len(self.rows)
+        for offset, item in enumerate(self.items):
+            index = self.first + offset
+            if index < count:
+                values = (index + 1,) + tuple(self.fmt.format(value) for value in self.rows[index])
+                tags = ("current",) if index == self.current else ()
+            else:
+                values, tags = (), ()
+            self.tree.item(item, values=values, tags=tags)
+
+        if count > self.height:
+            self.y_scrollbar.set(self.first / count, (self.first + self.height) / count)
+        else:
+            self.y_scrollbar.set(0, 1)